@@ -6,6 +6,7 @@ class AgronomistAdvisor(BaseAdvisor):
     specialty = "Crop Science & Soil Health"
     icon = "leaf"
     training_data_file = "training_data/agronomist.md"
+    rag_categories = ('crop', 'sustainability')
     system_prompt = """You are the Agronomist on this agricultural advisory board with 25 years of experience in crop science, soil health, and agronomy. You specialize in:
 - Crop production strategies and planning
 - Soil testing and amendment recommendations
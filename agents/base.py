@@ -1,12 +1,46 @@
 import os
+import json
+import hashlib
 import logging
+import threading
 from datetime import date
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 
+from data.cache import TTLCache
+from data.prompt_budget import HISTORY_TRIM_BLOCK, PROMPT_TOKEN_BUDGET, PromptSection, fit_to_budget
+from data.commodity_prices import CACHE_TTL_SECONDS
+
 logger = logging.getLogger(__name__)
 
+PROMPT_CACHE_SIZE = int(os.environ.get("PROMPT_CACHE_SIZE", "512"))
+HISTORY_MAX_MESSAGES = 20
+
+# Prompt sections ordered from most static to most dynamic, so consecutive calls share the longest
+# possible byte-identical prefix for provider-side prompt caching. The question layer is sent as a
+# separate system message after the conversation history.
+PROMPT_LAYERS = (
+    ("advisor", ("persona", "training_full", "response_format", "guidance")),
+    ("state", ("state_data", "state_focus", "seasonal", "prices")),
+    ("session", ("business", "records", "financial_analysis")),
+    ("question", ("training", "rag")),
+)
+_SECTION_POSITIONS = {
+    name: (layer_index, position)
+    for layer_index, (_, names) in enumerate(PROMPT_LAYERS)
+    for position, name in enumerate(names)
+}
+_SESSION_LAYER = 2
+_QUESTION_LAYER = 3
+
 _client = None
 _training_data_cache = {}
+# Profile-derived prompt sections, shared by every advisor. Keyed by (profile fingerprint, date,
+# price generation); entries expire with the prices.
+_prompt_cache = TTLCache(maxsize=PROMPT_CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+_usage_lock = threading.Lock()
+_usage_stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
 
 
 def get_openai_client():
@@ -34,12 +68,255 @@ def load_training_data(file_path):
         return None
 
 
+def load_training_sections(file_path):
+    from data.training_sections import get_section_index, index_training_text
+
+    section_index = get_section_index(file_path)
+    if section_index is None:
+        content = load_training_data(file_path)
+        if not content:
+            return None
+        section_index = index_training_text(file_path, content)
+    return section_index
+
+
+def index_training_data(advisor_classes):
+    count = 0
+    for advisor_class in advisor_classes:
+        if advisor_class.training_data_file:
+            section_index = load_training_sections(advisor_class.training_data_file)
+            count += len(section_index) if section_index else 0
+    logger.info(f"Indexed {count} training data sections")
+    return count
+
+
+def profile_fingerprint(user_profile):
+    payload = json.dumps(user_profile or {}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def invalidate_system_prompts(user_profile):
+    fingerprint = profile_fingerprint(user_profile)
+    return _prompt_cache.discard_where(lambda key: key[0] == fingerprint)
+
+
+def prompt_cache_stats():
+    return _prompt_cache.stats()
+
+
+def record_prompt_usage(advisor_id, usage):
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    with _usage_lock:
+        _usage_stats["requests"] += 1
+        _usage_stats["prompt_tokens"] += prompt_tokens
+        _usage_stats["cached_tokens"] += cached_tokens
+    logger.info(f"{advisor_id} prompt usage: {prompt_tokens} tokens, {cached_tokens} cached")
+
+
+def prompt_usage_stats():
+    with _usage_lock:
+        stats = dict(_usage_stats)
+    stats["cached_token_rate"] = (
+        stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+    )
+    return stats
+
+
+def layer_sections(sections):
+    positions = [
+        _SECTION_POSITIONS.get(section.name, (_SESSION_LAYER, len(_SECTION_POSITIONS)))
+        for section in sections
+    ]
+    ordered = [section for _, section in sorted(zip(positions, sections), key=lambda item: item[0])]
+    split = sum(1 for layer, _ in positions if layer < _QUESTION_LAYER)
+    return ordered[:split], ordered[split:]
+
+
+def _business_sections(user_profile):
+    state = user_profile.get('state', '')
+    business_name = user_profile.get('business_name', '')
+    business_type = user_profile.get('business_type', '')
+    business_description = user_profile.get('business_description', '')
+    business_data = user_profile.get('business_data')
+
+    context = "\n\nIMPORTANT CONTEXT ABOUT THIS BUSINESS:\n"
+    if business_name:
+        context += f"- Business Name: {business_name}\n"
+    if business_type:
+        context += f"- Business Type: {business_type}\n"
+    if state:
+        context += f"- Location: {state}\n"
+    if business_description:
+        context += f"- Description: {business_description}\n"
+    sections = [("business", context)]
+
+    if business_data:
+        records = "\n\nBUSINESS RECORDS PROVIDED:\n"
+        records += f"- {business_data.get('summary', 'Business data uploaded')}\n"
+        records += f"- Data columns: {', '.join(business_data.get('headers', []))}\n"
+        records += "\nSample data from their records:\n"
+        for i, row in enumerate(business_data.get('preview', [])[:5]):
+            row_str = ', '.join([f"{k}: {v}" for k, v in list(row.items())[:5]])
+            records += f"  Row {i+1}: {row_str}\n"
+        records += "\nUse this business data to provide specific, data-driven advice. Reference their actual numbers when relevant."
+        sections.append(("records", records))
+
+    financial_analysis = user_profile.get('financial_analysis')
+    if financial_analysis:
+        sections.append((
+            "financial_analysis",
+            f"\n\nCOMPUTED FINANCIAL ANALYSIS (calculated from uploaded records):\n{financial_analysis}"
+        ))
+
+    return sections
+
+
+def _state_industry_data(state, business_type, bundle):
+    if bundle is not None:
+        return bundle['advisor_context']
+    from data.query import get_advisor_context
+    return get_advisor_context(state, business_type)
+
+
+def _seasonal_context(state, business_type):
+    from data.ag_calendar import get_seasonal_context
+    growing_season_start = None
+    if state:
+        try:
+            from data.query import get_growing_season_start
+            growing_season_start = get_growing_season_start(state)
+        except Exception as e:
+            logger.debug(f"Could not fetch growing season: {e}")
+    return get_seasonal_context(
+        state_name=state or None,
+        business_type=business_type or None,
+        current_date=date.today(),
+        growing_season_start=growing_season_start,
+    )
+
+
+def _price_data(state, business_type, bundle):
+    if bundle is not None:
+        return bundle['prices']
+    from data.commodity_prices import get_relevant_prices
+    return get_relevant_prices(state or None, business_type or None, strict=True)
+
+
+def build_profile_sections(user_profile):
+    complete = True
+    state = user_profile.get('state', '')
+    business_type = user_profile.get('business_type', '')
+
+    bundle = None
+    if state or business_type:
+        try:
+            from data.context_bundles import get_context_bundle
+            bundle = get_context_bundle(state or None, business_type or None)
+        except Exception as e:
+            logger.debug(f"Could not read context bundle: {e}")
+
+    # The database, calendar and price lookups are independent, so run them side by side.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        local_future = seasonal_future = price_future = None
+        if state or business_type:
+            local_future = executor.submit(copy_context().run, _state_industry_data, state, business_type, bundle)
+            price_future = executor.submit(copy_context().run, _price_data, state, business_type, bundle)
+        seasonal_future = executor.submit(copy_context().run, _seasonal_context, state, business_type)
+
+        sections = _business_sections(user_profile)
+
+        if local_future is not None:
+            try:
+                local_data = local_future.result()
+                if local_data:
+                    sections.append((
+                        "state_data",
+                        f"\n\nSTATE & INDUSTRY DATA (from database — use these real data points in your advice):\n{local_data}"
+                    ))
+            except Exception as e:
+                logger.warning(f"Failed to load state and industry data: {e}")
+                complete = False
+
+        sections.append((
+            "guidance",
+            "\nTailor all your advice specifically to their location, business type, and operations. Reference relevant state-specific regulations, market conditions, and industry trends when applicable."
+        ))
+
+        try:
+            seasonal_context = seasonal_future.result()
+            if seasonal_context:
+                sections.append(("seasonal", f"\n\nCURRENT SEASONAL CONTEXT & UPCOMING DEADLINES:\n{seasonal_context}"))
+        except Exception as e:
+            logger.warning(f"Failed to load seasonal context: {e}")
+            complete = False
+
+        if price_future is not None:
+            try:
+                price_data = price_future.result()
+                if price_data and "unavailable" not in price_data.lower():
+                    sections.append(("prices", f"\n\nCURRENT COMMODITY PRICES (live market data):\n{price_data}"))
+            except Exception as e:
+                logger.warning(f"Failed to load commodity prices: {e}")
+                complete = False
+
+    return tuple(sections), complete
+
+
+def get_profile_sections(user_profile):
+    from data.commodity_prices import get_price_generation
+
+    key = (profile_fingerprint(user_profile), date.today().isoformat(), get_price_generation())
+    sections = _prompt_cache.get(key)
+    if sections is None:
+        sections, complete = build_profile_sections(user_profile)
+        # Don't pin a context that is missing sections because of an error; a price refresh
+        # bumps the generation, so prices that were unavailable are picked up on their own.
+        if complete:
+            _prompt_cache.set(key, sections)
+    return sections
+
+
+def _retrieve_rag_candidates(message, user_profile):
+    from data.rag import retrieve_candidates
+
+    try:
+        return retrieve_candidates(
+            message,
+            state_name=(user_profile or {}).get('state') or None,
+            business_type=(user_profile or {}).get('business_type') or None
+        )
+    except Exception as e:
+        logger.warning(f"Shared RAG retrieval failed: {e}")
+        return None
+
+
+class BoardContext:
+
+    def __init__(self, user_profile, profile_sections=(), rag_candidates=None):
+        self.user_profile = user_profile
+        self.profile_sections = profile_sections
+        self.rag_candidates = rag_candidates
+
+    @classmethod
+    def build(cls, message, user_profile):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            rag_future = executor.submit(copy_context().run, _retrieve_rag_candidates, message, user_profile)
+            profile_sections = get_profile_sections(user_profile) if user_profile else ()
+            return cls(user_profile, profile_sections, rag_future.result())
+
+
 class BaseAdvisor:
     title = "Advisor"
     specialty = "General"
     icon = "user"
     system_prompt = "You are an advisor."
     training_data_file = None
+    rag_categories = ()
+    prompt_token_budget = None
 
     @classmethod
     def info(cls):
@@ -50,95 +327,62 @@ class BaseAdvisor:
         }
 
     @classmethod
-    def build_system_prompt(cls, user_profile=None):
-        base = cls.system_prompt
+    def get_training_context(cls, message=None, user_profile=None):
+        from data.training_sections import TRAINING_FULL_FILE, TRAINING_SECTIONS_TOP_N
+
+        if not cls.training_data_file:
+            return None
+        if message is None or TRAINING_FULL_FILE:
+            return load_training_data(cls.training_data_file)
+
+        section_index = load_training_sections(cls.training_data_file)
+        if section_index is None:
+            return None
+        business_type = user_profile.get('business_type', '') if user_profile else ''
+        return section_index.relevant_text(f"{message} {business_type}", TRAINING_SECTIONS_TOP_N)
+
+    @classmethod
+    def build_prompt_sections(cls, user_profile=None, message=None, board_context=None):
+        sections = [("persona", cls.system_prompt)]
 
         if cls.training_data_file:
-            training_data = load_training_data(cls.training_data_file)
+            from data.training_sections import TRAINING_FULL_FILE
+
+            training_data = cls.get_training_context(message, user_profile)
             if training_data:
-                base += f"\n\nREFERENCE KNOWLEDGE:\nUse the following domain knowledge to inform your responses. Reference specific data points, benchmarks, and programs when relevant to the user's question.\n\n{training_data}"
-
-        if user_profile:
-            state = user_profile.get('state', '')
-            business_name = user_profile.get('business_name', '')
-            business_type = user_profile.get('business_type', '')
-            business_description = user_profile.get('business_description', '')
-            business_data = user_profile.get('business_data')
-
-            context = "\n\nIMPORTANT CONTEXT ABOUT THIS BUSINESS:\n"
-            if business_name:
-                context += f"- Business Name: {business_name}\n"
-            if business_type:
-                context += f"- Business Type: {business_type}\n"
-            if state:
-                context += f"- Location: {state}\n"
-            if business_description:
-                context += f"- Description: {business_description}\n"
-
-            if business_data:
-                context += "\n\nBUSINESS RECORDS PROVIDED:\n"
-                context += f"- {business_data.get('summary', 'Business data uploaded')}\n"
-                context += f"- Data columns: {', '.join(business_data.get('headers', []))}\n"
-                context += "\nSample data from their records:\n"
-                for i, row in enumerate(business_data.get('preview', [])[:5]):
-                    row_str = ', '.join([f"{k}: {v}" for k, v in list(row.items())[:5]])
-                    context += f"  Row {i+1}: {row_str}\n"
-                context += "\nUse this business data to provide specific, data-driven advice. Reference their actual numbers when relevant."
-
-            financial_analysis = user_profile.get('financial_analysis')
-            if financial_analysis:
-                context += f"\n\nCOMPUTED FINANCIAL ANALYSIS (calculated from uploaded records):\n{financial_analysis}"
-
-            if state or business_type:
-                try:
-                    from data.query import get_advisor_context
-                    local_data = get_advisor_context(state, business_type)
-                    if local_data:
-                        context += f"\n\nSTATE & INDUSTRY DATA (from database — use these real data points in your advice):\n{local_data}"
-                except Exception:
-                    pass
-
-            context += "\nTailor all your advice specifically to their location, business type, and operations. Reference relevant state-specific regulations, market conditions, and industry trends when applicable."
+                # Sections picked for this question belong to the question layer; the whole file is static.
+                name = "training_full" if message is None or TRAINING_FULL_FILE else "training"
+                sections.append((name, f"\n\nREFERENCE KNOWLEDGE:\nUse the following domain knowledge to inform your responses. Reference specific data points, benchmarks, and programs when relevant to the user's question.\n\n{training_data}"))
 
-            try:
-                from data.ag_calendar import get_seasonal_context
-                growing_season_start = None
-                if state:
-                    try:
-                        from data.query import _query
-                        rows = _query("SELECT growing_season_start FROM state_ag_profiles WHERE state_name = %s", (state,))
-                        if rows:
-                            growing_season_start = rows[0].get('growing_season_start')
-                    except Exception as e:
-                        logger.debug(f"Could not fetch growing season: {e}")
-                seasonal_context = get_seasonal_context(
-                    state_name=state or None,
-                    business_type=business_type or None,
-                    current_date=date.today(),
-                    growing_season_start=growing_season_start,
-                )
-                if seasonal_context:
-                    context += f"\n\nCURRENT SEASONAL CONTEXT & UPCOMING DEADLINES:\n{seasonal_context}"
-            except Exception as e:
-                logger.warning(f"Failed to load seasonal context: {e}")
+        if board_context is not None:
+            sections.extend(board_context.profile_sections)
+        elif user_profile:
+            sections.extend(get_profile_sections(user_profile))
 
-            if state or business_type:
-                try:
-                    from data.commodity_prices import get_relevant_prices
-                    price_data = get_relevant_prices(state or None, business_type or None)
-                    if price_data and "unavailable" not in price_data.lower():
-                        context += f"\n\nCURRENT COMMODITY PRICES (live market data):\n{price_data}"
-                except Exception as e:
-                    logger.warning(f"Failed to load commodity prices: {e}")
+        sections.append(("response_format", "\n\nRESPONSE FORMAT: Keep your response concise. Write ONE short paragraph of analysis or advice, then list your TWO most important suggestions as numbered items. Do not exceed this format."))
 
-            base += context
+        return sections
 
-        base += "\n\nRESPONSE FORMAT: Keep your response concise. Write ONE short paragraph of analysis or advice, then list your TWO most important suggestions as numbered items. Do not exceed this format."
+    @classmethod
+    def build_system_prompt(cls, user_profile=None, message=None, board_context=None):
+        sections = [
+            PromptSection.from_text(name, text)
+            for name, text in cls.build_prompt_sections(user_profile, message, board_context)
+        ]
+        return "".join(section.text for layer in layer_sections(sections) for section in layer)
+
+    @classmethod
+    def get_rag_context(cls, message, user_profile=None, rag_candidates=None):
+        from data.rag import retrieve_candidates, rerank_candidates, format_context
 
-        return base
+        if rag_candidates is None:
+            state = user_profile.get('state') if user_profile else None
+            btype = user_profile.get('business_type') if user_profile else None
+            rag_candidates = retrieve_candidates(message, state_name=state, business_type=btype)
+        return format_context(rerank_candidates(rag_candidates, cls.rag_categories, top_k=3), message)
 
     @classmethod
-    def get_response(cls, message, session_id, user_profile, conversation_histories):
+    def get_response(cls, message, session_id, user_profile, conversation_histories, board_context=None):
         client = get_openai_client()
         advisor_id = cls.get_advisor_id()
 
@@ -146,24 +390,30 @@ class BaseAdvisor:
         if history_key not in conversation_histories:
             conversation_histories[history_key] = []
 
-        system_prompt = cls.build_system_prompt(user_profile)
+        sections = cls.build_prompt_sections(user_profile, message, board_context)
 
         rag_context = None
         try:
-            from data.rag import get_relevant_context
-            state = user_profile.get('state') if user_profile else None
-            btype = user_profile.get('business_type') if user_profile else None
-            rag_context = get_relevant_context(message, top_k=3, state_name=state, business_type=btype)
+            rag_candidates = board_context.rag_candidates if board_context is not None else None
+            rag_context = cls.get_rag_context(message, user_profile, rag_candidates)
         except Exception as e:
             logger.warning(f"Failed to retrieve RAG context: {e}")
 
         if rag_context:
-            system_prompt += f"\n\nRELEVANT REFERENCE DOCUMENTS (from USDA publications and extension guides — cite specific details when applicable):\n{rag_context}"
+            sections.append(("rag", f"\n\nRELEVANT REFERENCE DOCUMENTS (from USDA publications and extension guides — cite specific details when applicable):\n{rag_context}"))
 
+        prompt_sections = [PromptSection.from_text(name, text) for name, text in sections]
+        history = PromptSection.from_messages("history", conversation_histories[history_key])
+        fit_to_budget(prompt_sections + [history], cls.get_prompt_token_budget(), label=f"{advisor_id} prompt")
+
+        static_sections, question_sections = layer_sections(prompt_sections)
         messages = [
-            {"role": "system", "content": system_prompt}
+            {"role": "system", "content": "".join(section.text for section in static_sections)}
         ]
-        messages.extend(conversation_histories[history_key])
+        messages.extend(history.units)
+        question_context = "".join(section.text for section in question_sections).strip()
+        if question_context:
+            messages.append({"role": "system", "content": question_context})
         messages.append({"role": "user", "content": message})
 
         try:
@@ -174,12 +424,15 @@ class BaseAdvisor:
             )
 
             assistant_message = response.choices[0].message.content
+            record_prompt_usage(advisor_id, getattr(response, "usage", None))
 
             conversation_histories[history_key].append({"role": "user", "content": message})
             conversation_histories[history_key].append({"role": "assistant", "content": assistant_message})
 
-            if len(conversation_histories[history_key]) > 20:
-                conversation_histories[history_key] = conversation_histories[history_key][-20:]
+            # Drop a whole block at a time so the history that follows the cached prefix stays
+            # unchanged for several turns; at least HISTORY_MAX_MESSAGES are always kept.
+            if len(conversation_histories[history_key]) > HISTORY_MAX_MESSAGES + HISTORY_TRIM_BLOCK:
+                conversation_histories[history_key] = conversation_histories[history_key][-HISTORY_MAX_MESSAGES:]
 
             return {
                 'advisor_id': advisor_id,
@@ -195,6 +448,10 @@ class BaseAdvisor:
                 'icon': cls.icon
             }
 
+    @classmethod
+    def get_prompt_token_budget(cls):
+        return cls.prompt_token_budget or PROMPT_TOKEN_BUDGET
+
     @classmethod
     def get_advisor_id(cls):
         from agents import ADVISOR_CLASSES
@@ -6,6 +6,7 @@ class FinancialAdvisor(BaseAdvisor):
     specialty = "Ag Economics & Investment"
     icon = "chart-line"
     training_data_file = "training_data/financial.md"
+    rag_categories = ('financial',)
     system_prompt = """You are the Finance Director on this agricultural advisory board with extensive experience in agricultural economics. You specialize in:
 - Business budgeting and cash flow management
 - Agricultural loans, financing, and capital planning
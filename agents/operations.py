@@ -6,6 +6,7 @@ class OperationsAdvisor(BaseAdvisor):
     specialty = "Ag Operations & Logistics"
     icon = "cogs"
     training_data_file = "training_data/operations.md"
+    rag_categories = ('crop', 'livestock')
     system_prompt = """You are the Operations Manager on this agricultural advisory board with expertise in agricultural business operations. You specialize in:
 - Equipment selection, maintenance, and fleet management
 - Labor management and workforce planning
@@ -6,6 +6,7 @@ class RiskAdvisor(BaseAdvisor):
     specialty = "Risk Management & Insurance"
     icon = "shield-alt"
     training_data_file = "training_data/risk.md"
+    rag_categories = ('risk',)
     system_prompt = """You are the Risk Advisor on this agricultural advisory board with deep expertise in agricultural risk management. You specialize in:
 - Enterprise risk assessment and mitigation
 - Crop and livestock insurance programs (MPCI, PRF, LRP, LGM)
@@ -6,6 +6,7 @@ class SustainabilityAdvisor(BaseAdvisor):
     specialty = "Environmental Stewardship"
     icon = "seedling"
     training_data_file = "training_data/sustainability.md"
+    rag_categories = ('sustainability',)
     system_prompt = """You are the Sustainability Advisor on this agricultural advisory board focused on environmental stewardship across the ag industry. You specialize in:
 - Certification processes (organic, sustainable, fair trade)
 - Regenerative and conservation practices
@@ -0,0 +1,74 @@
+import sys
+import argparse
+
+from data.query import _format_state_programs, _format_state_commodities
+from data.reference_snapshot import get_snapshot
+from data.tokens import estimate_tokens
+
+SECTIONS = {
+    "programs": _format_state_programs,
+    "commodities": _format_state_commodities,
+}
+STYLES = ("bullets", "table")
+
+
+def measure(snapshot, states=None):
+    states = sorted(states or snapshot.profiles)
+    results = []
+    for state_name in states:
+        row = {"state": state_name}
+        for section, render in SECTIONS.items():
+            rows = getattr(snapshot, section).get(state_name)
+            for style in STYLES:
+                row[(section, style)] = estimate_tokens(render(state_name, rows, style=style)) if rows else 0
+        results.append(row)
+    return results
+
+
+def _saving(bullets, table):
+    return f"{(1 - table / bullets) * 100:5.1f}%" if bullets else "    -"
+
+
+def report(results):
+    header = f"{'State':<16}"
+    for section in SECTIONS:
+        header += f" {section + ' bullets':>20} {section + ' table':>18} {'saved':>6}"
+    print(header)
+
+    totals = {key: 0 for key in results[0] if key != "state"} if results else {}
+    for row in results:
+        line = f"{row['state']:<16}"
+        for section in SECTIONS:
+            bullets, table = row[(section, "bullets")], row[(section, "table")]
+            line += f" {bullets:>20} {table:>18} {_saving(bullets, table):>6}"
+        print(line)
+        for key in totals:
+            totals[key] += row[key]
+
+    print()
+    for section in SECTIONS:
+        bullets, table = totals[(section, "bullets")], totals[(section, "table")]
+        print(f"{section}: {bullets} -> {table} estimated tokens across {len(results)} states "
+              f"({_saving(bullets, table).strip()} saved)")
+    bullets = sum(totals[(section, "bullets")] for section in SECTIONS)
+    table = sum(totals[(section, "table")] for section in SECTIONS)
+    print(f"total: {bullets} -> {table} estimated tokens ({_saving(bullets, table).strip()} saved)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare prompt token counts of the bullet and table renderings of reference data."
+    )
+    parser.add_argument("states", nargs="*", help="states to measure (default: all seeded states)")
+    args = parser.parse_args(argv)
+
+    snapshot = get_snapshot(reload=True)
+    if snapshot is None:
+        print("Reference data is unavailable; set DATABASE_URL and run seed_state_data.py first.")
+        return 1
+    report(measure(snapshot, args.states))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
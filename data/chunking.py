@@ -0,0 +1,118 @@
+import os
+import re
+
+from data.tokens import estimate_tokens
+
+CHUNK_MAX_TOKENS = int(os.environ.get("RAG_CHUNK_TOKENS", "350"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("RAG_CHUNK_OVERLAP_TOKENS", "40"))
+HEADING_SEPARATOR = " > "
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_LIST_ITEM_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"(])')
+
+
+def _sections(text):
+    path = []
+    body = []
+    sections = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            sections.append((list(path), content))
+        body.clear()
+
+    for line in text.splitlines():
+        match = _HEADING_RE.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            del path[level - 1:]
+            path.extend([""] * (level - 1 - len(path)))
+            path.append(match.group(2))
+            continue
+        body.append(line)
+    flush()
+
+    return [([h for h in p if h], content) for p, content in sections]
+
+
+def _units(content):
+    units = []
+    for paragraph in re.split(r'\n\s*\n', content):
+        lines = [line for line in paragraph.splitlines() if line.strip()]
+        if not lines:
+            continue
+        if any(_LIST_ITEM_RE.match(line) for line in lines):
+            units.extend((line.strip(), "\n") for line in lines)
+        else:
+            sentences = _SENTENCE_RE.split(" ".join(line.strip() for line in lines))
+            units.extend((sentence, " ") for sentence in sentences[:-1])
+            units.append((sentences[-1], "\n\n"))
+    return units
+
+
+def _split_long_unit(unit, max_tokens):
+    text, sep = unit
+    words = text.split()
+    pieces = []
+    current = []
+    for word in words:
+        current.append(word)
+        if estimate_tokens(" ".join(current)) >= max_tokens:
+            pieces.append((" ".join(current), " "))
+            current = []
+    if current:
+        pieces.append((" ".join(current), sep))
+    return pieces
+
+
+def _join(units):
+    return "".join(text + sep for text, sep in units).strip()
+
+
+def _pack(units, max_tokens, overlap_tokens):
+    pieces = []
+    current = []
+    current_tokens = 0
+
+    for unit in units:
+        unit_tokens = estimate_tokens(unit[0])
+        if current and current_tokens + unit_tokens > max_tokens:
+            pieces.append(_join(current))
+            overlap = []
+            overlap_size = 0
+            for prev in reversed(current):
+                prev_tokens = estimate_tokens(prev[0])
+                if overlap_size + prev_tokens > overlap_tokens:
+                    break
+                overlap.insert(0, prev)
+                overlap_size += prev_tokens
+            current = overlap
+            current_tokens = overlap_size
+        current.append(unit)
+        current_tokens += unit_tokens
+
+    if current:
+        pieces.append(_join(current))
+    return pieces
+
+
+def chunk_markdown(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    chunks = []
+    for path, content in _sections(text):
+        heading_path = HEADING_SEPARATOR.join(path) or None
+        if estimate_tokens(content) <= max_tokens:
+            chunks.append({"text": content, "heading_path": heading_path})
+            continue
+
+        units = []
+        for unit in _units(content):
+            if estimate_tokens(unit[0]) > max_tokens:
+                units.extend(_split_long_unit(unit, max_tokens))
+            else:
+                units.append(unit)
+        for piece in _pack(units, max_tokens, overlap_tokens):
+            chunks.append({"text": piece, "heading_path": heading_path})
+    return chunks
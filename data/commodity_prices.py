@@ -8,6 +8,7 @@ logger = logging.getLogger(__name__)
 _price_cache = {
     "data": None,
     "timestamp": 0,
+    "generation": 0,
 }
 
 CACHE_TTL_SECONDS = 3600
@@ -123,12 +124,17 @@ def _get_cached_prices():
     if prices:
         _price_cache["data"] = prices
         _price_cache["timestamp"] = now
+        _price_cache["generation"] += 1
     elif _price_cache["data"] is not None:
         return _price_cache["data"]
 
     return prices
 
 
+def get_price_generation():
+    return _price_cache["generation"]
+
+
 def get_commodity_prices():
     prices = _get_cached_prices()
 
@@ -149,7 +155,7 @@ def get_commodity_prices():
     return "\n".join(lines)
 
 
-def get_relevant_prices(state_name, business_type):
+def get_relevant_prices(state_name, business_type, strict=False):
     prices = _get_cached_prices()
 
     if not prices:
@@ -160,7 +166,7 @@ def get_relevant_prices(state_name, business_type):
     if state_name:
         try:
             from data.query import get_state_commodities as _get_state_commodities
-            commodities_text = _get_state_commodities(state_name)
+            commodities_text = _get_state_commodities(state_name, strict=strict)
             if commodities_text:
                 text_lower = commodities_text.lower()
                 for commodity, keywords in COMMODITY_KEYWORDS.items():
@@ -169,6 +175,9 @@ def get_relevant_prices(state_name, business_type):
                             relevant_commodities.add(commodity)
                             break
         except Exception as e:
+            # strict callers cache the result, so they must not keep the unfiltered list.
+            if strict:
+                raise
             logger.warning(f"Failed to get state commodities for relevance matching: {e}")
 
     if business_type:
@@ -0,0 +1,97 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from data.cache import TTLCache
+from data.commodity_prices import CACHE_TTL_SECONDS, get_price_generation, get_relevant_prices
+from data.query import get_advisor_context
+from data.reference_snapshot import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_WARMUP = os.environ.get("CONTEXT_WARMUP", "0").lower() in ("1", "true", "yes")
+CONTEXT_WARMUP_WORKERS = int(os.environ.get("CONTEXT_WARMUP_WORKERS", "8"))
+CONTEXT_BUNDLE_SIZE = int(os.environ.get("CONTEXT_BUNDLE_SIZE", "1024"))
+
+# Keyed by (state, business type, reference data version, price generation).
+_bundles = TTLCache(maxsize=CONTEXT_BUNDLE_SIZE, ttl=CACHE_TTL_SECONDS)
+_warm_targets = None
+_warmed_key = None
+_warm_lock = threading.Lock()
+_warm_thread = None
+_warm_thread_lock = threading.Lock()
+
+
+def _data_key():
+    snapshot = get_snapshot()
+    return (snapshot.version if snapshot is not None else None, get_price_generation())
+
+
+def render_bundle(state_name, business_type):
+    return {
+        "advisor_context": get_advisor_context(state_name, business_type),
+        "prices": get_relevant_prices(state_name, business_type, strict=True),
+    }
+
+
+def get_context_bundle(state_name, business_type):
+    data_key = _data_key()
+    bundle = _bundles.get((state_name, business_type) + data_key)
+    if bundle is None and CONTEXT_WARMUP and _warmed_key not in (None, data_key):
+        # Prices were refreshed or the reference data reseeded since the last warm-up.
+        _start_background_warm()
+    return bundle
+
+
+def _start_background_warm():
+    global _warm_thread
+    with _warm_thread_lock:
+        if _warm_thread is None or not _warm_thread.is_alive():
+            _warm_thread = threading.Thread(target=warm_context_bundles, daemon=True)
+            _warm_thread.start()
+        return _warm_thread
+
+
+def context_bundle_stats():
+    return _bundles.stats()
+
+
+def warm_context_bundles(states=None, business_types=None, workers=CONTEXT_WARMUP_WORKERS):
+    global _warm_targets, _warmed_key
+
+    if not _warm_lock.acquire(blocking=False):
+        return 0
+    try:
+        if states is not None:
+            _warm_targets = (list(states), list(business_types))
+        if _warm_targets is None:
+            return 0
+        states, business_types = _warm_targets
+
+        start = time.perf_counter()
+        # Fetch prices and the snapshot once up front instead of from every worker.
+        get_relevant_prices(None, None)
+        data_key = _data_key()
+        combinations = [(s, b) for s in states for b in business_types]
+
+        def render(combination):
+            try:
+                _bundles.set(combination + data_key, render_bundle(*combination))
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to render context for {combination[0]} / {combination[1]}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rendered = sum(executor.map(render, combinations))
+
+        _warmed_key = data_key
+        logger.info(
+            f"Warmed {rendered}/{len(combinations)} state and business-type context bundles "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return rendered
+    finally:
+        _warm_lock.release()
@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool, extensions
+
+logger = logging.getLogger(__name__)
+
+POOL_MIN_CONN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX_CONN = int(os.environ.get("DB_POOL_MAX", "10"))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+HEALTH_CHECK_IDLE_SECONDS = float(os.environ.get("DB_POOL_HEALTH_CHECK_IDLE", "30"))
+
+POOL_SIZES = {
+    "reference": POOL_MAX_CONN,
+    "rag": POOL_MAX_CONN,
+    "app": max(2, POOL_MAX_CONN // 2),
+}
+
+
+class PoolTimeout(pool.PoolError):
+    pass
+
+
+class ConnectionPool:
+
+    def __init__(self, name, dsn, minconn=POOL_MIN_CONN, maxconn=POOL_MAX_CONN, timeout=POOL_CHECKOUT_TIMEOUT):
+        self.name = name
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pool.ThreadedConnectionPool(min(minconn, maxconn), maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+        }
+
+    @property
+    def closed(self):
+        return self._pool.closed
+
+    def _acquire_slot(self):
+        if self._slots.acquire(blocking=False):
+            return
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_time_ms"] += waited_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            if not acquired:
+                self._stats["timeouts"] += 1
+        if not acquired:
+            raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a '{self.name}' connection")
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            last_used = self._last_used.get(conn)
+            if last_used is None or time.monotonic() - last_used < HEALTH_CHECK_IDLE_SECONDS:
+                return True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        self._acquire_slot()
+        try:
+            # Several idle connections can go stale together (a database restart), so keep
+            # discarding until the pool hands out a healthy one or opens a new one.
+            for _ in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                self._discard(conn)
+            else:
+                raise pool.PoolError(f"No healthy '{self.name}' connection available")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self._pool.putconn(conn, close=True)
+
+    def putconn(self, conn, close=False):
+        try:
+            if not close and not conn.closed:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            if close or conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[conn] = time.monotonic()
+                self._pool.putconn(conn)
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_size"] = self.maxconn
+        stats["avg_wait_ms"] = stats["wait_time_ms"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name="reference"):
+    p = _pools.get(name)
+    if p is None or p.closed:
+        with _pools_lock:
+            p = _pools.get(name)
+            if p is None or p.closed:
+                p = ConnectionPool(name, os.environ["DATABASE_URL"], maxconn=POOL_SIZES.get(name, POOL_MAX_CONN))
+                _pools[name] = p
+    return p
+
+
+@contextmanager
+def connection(name="reference"):
+    p = get_pool(name)
+    conn = p.getconn()
+    broken = False
+    try:
+        yield conn
+    except psycopg2.OperationalError:
+        broken = True
+        raise
+    finally:
+        p.putconn(conn, close=broken)
+
+
+def pool_metrics():
+    return {name: p.metrics() for name, p in _pools.items()}
@@ -0,0 +1,129 @@
+import os
+import re
+import base64
+import zlib
+import threading
+
+import numpy as np
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.7"))
+MMR_LAMBDA = float(os.environ.get("RAG_MMR_LAMBDA", "0.7"))
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, (1 << 31) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 31) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def _words(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = _words(text)
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text):
+    hashed = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) & 0x7FFFFFFF for s in shingles(text)),
+        dtype=np.uint64
+    )
+    if hashed.size == 0:
+        return np.full(MINHASH_PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint32)
+    permuted = (np.outer(hashed, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature):
+    return base64.b64encode(np.asarray(signature, dtype=np.uint32).tobytes()).decode("ascii")
+
+
+def decode_signature(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.uint32)
+
+
+def estimate_similarity(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+class NearDuplicateIndex:
+
+    def __init__(self, bands=LSH_BANDS, threshold=DUPLICATE_THRESHOLD):
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self.threshold = threshold
+        self.buckets = {}
+        self.signatures = {}
+        self.duplicate_of = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def find_duplicate(self, signature):
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        best_id, best_score = None, self.threshold
+        for doc_id in candidates:
+            score = estimate_similarity(signature, self.signatures[doc_id])
+            if score >= best_score:
+                best_id, best_score = doc_id, score
+        return best_id
+
+    def add(self, doc_id, signature):
+        # Only canonical chunks enter the buckets; returns the canonical id if doc_id is a near-duplicate.
+        with self._lock:
+            canonical = self.find_duplicate(signature)
+            if canonical is not None:
+                self.duplicate_of[doc_id] = canonical
+                return canonical
+            self.signatures[doc_id] = signature
+            for key in self._band_keys(signature):
+                self.buckets.setdefault(key, set()).add(doc_id)
+            return None
+
+    def is_duplicate(self, doc_id):
+        return doc_id in self.duplicate_of
+
+
+def _token_set(text):
+    return set(_words(text))
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_select(results, top_k, lambda_=MMR_LAMBDA, score=None, text_key='chunk_text'):
+    score = score or (lambda r: r['similarity'])
+    if len(results) <= 1:
+        return list(results[:top_k])
+
+    top_score = max(score(r) for r in results) or 1.0
+    remaining = [(r, score(r) / top_score, _token_set(r[text_key]), shingles(r[text_key])) for r in results]
+    selected = []
+    while remaining and len(selected) < top_k:
+        best, best_value = None, None
+        for candidate in remaining:
+            redundancy = max((_jaccard(candidate[2], s[2]) for s in selected), default=0.0)
+            value = lambda_ * candidate[1] - (1.0 - lambda_) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = candidate, value
+        remaining.remove(best)
+        if any(_jaccard(best[3], s[3]) >= DUPLICATE_THRESHOLD for s in selected):
+            continue
+        selected.append(best)
+    return [s[0] for s in selected]
@@ -0,0 +1,184 @@
+import os
+import math
+import zlib
+import base64
+import logging
+import threading
+
+import numpy as np
+
+from data.rag import BUSINESS_TYPE_BOOST, _tokenize
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.environ.get("RAG_EMBEDDING_DIM", "384"))
+RAG_EMBEDDER = os.environ.get("RAG_EMBEDDER", "hashing")
+SCORE_BLOCK_ROWS = 8192
+
+
+class Embedder:
+    name = "base"
+    dim = 0
+
+    @property
+    def model_id(self):
+        return f"{self.name}-{self.dim}"
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(Embedder):
+    name = "hashing"
+
+    def __init__(self, dim=EMBEDDING_DIM, char_ngrams=(3, 4), word_bigrams=True):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.word_bigrams = word_bigrams
+
+    def _features(self, text):
+        words = _tokenize(text)
+        features = {}
+        for word in words:
+            features[word] = features.get(word, 0) + 1
+            padded = f"<{word}>"
+            for n in self.char_ngrams:
+                for i in range(len(padded) - n + 1):
+                    gram = "#" + padded[i:i + n]
+                    features[gram] = features.get(gram, 0) + 0.5
+        if self.word_bigrams:
+            for a, b in zip(words, words[1:]):
+                gram = a + " " + b
+                features[gram] = features.get(gram, 0) + 1
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text).items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign * math.sqrt(weight)
+        return normalize(matrix)
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+}
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                factory = EMBEDDERS.get(RAG_EMBEDDER)
+                if factory is None:
+                    logger.warning(f"Unknown embedder '{RAG_EMBEDDER}', using hashing embedder")
+                    factory = HashingEmbedder
+                _embedder = factory()
+    return _embedder
+
+
+def set_embedder(embedder):
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def encode_vector(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.float32)
+
+
+class VectorIndex:
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.categories = np.zeros(0, dtype=object)
+        self.states = np.zeros(0, dtype=object)
+        self.business_types = np.zeros(0, dtype=object)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_arrays(cls, dim, ids, matrix, categories, states, business_types):
+        index = cls(dim)
+        index.ids = ids
+        index.matrix = matrix
+        index.categories = _object_array(categories)
+        index.states = _object_array(states)
+        index.business_types = _object_array(business_types)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_many(self, ids, vectors, metas):
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+            self.matrix = np.vstack([self.matrix, vectors])
+            self.categories = np.concatenate([self.categories, _object_array(m['category'] for m in metas)])
+            self.states = np.concatenate([self.states, _object_array(m['state_relevance'] for m in metas)])
+            self.business_types = np.concatenate(
+                [self.business_types, _object_array(m['business_type_relevance'] for m in metas)]
+            )
+
+    def _filter_mask(self, category=None, state_name=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if category:
+            mask &= self.categories == category
+        if state_name:
+            mask &= (self.states == None) | (self.states == state_name)  # noqa: E711
+        return mask
+
+    def _scores(self, query_vector):
+        if self.matrix.dtype == np.float32:
+            return self.matrix @ query_vector
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query_vector
+        return scores
+
+    def search(self, query_vector, top_k=5, category=None, state_name=None, business_type=None):
+        with self._lock:
+            if not len(self.ids):
+                return []
+            scores = self._scores(np.asarray(query_vector, dtype=np.float32))
+            if business_type:
+                boosted = (self.business_types == business_type) & (scores > 0)
+                scores = np.where(boosted, scores * BUSINESS_TYPE_BOOST, scores)
+            if category or state_name:
+                scores = np.where(self._filter_mask(category, state_name), scores, -np.inf)
+
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def _object_array(values):
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from data.db import connection
+from data.rag import (
+    CATEGORY_KEYWORDS,
+    prepare_chunks,
+    insert_chunk_rows,
+    delete_document_chunks,
+    remove_document,
+    document_hash,
+    get_document_hashes,
+    upsert_document_hashes,
+    bump_corpus_version,
+    reload_indexes,
+)
+from data.tagging import configure_tagger, get_tagger
+from data.profile_options import US_STATES, BOARD_SUGGESTIONS
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.environ.get("RAG_INGEST_WORKERS", "0")) or None
+INGEST_BATCH_CHUNKS = int(os.environ.get("RAG_INGEST_BATCH_CHUNKS", "2000"))
+DEFAULT_COLLECTION = "bulk"
+DEFAULT_SOURCE = "Extension Publication"
+DEFAULT_CATEGORY = "general"
+DOCUMENT_EXTENSIONS = (".md", ".txt")
+
+
+def _infer_title(text, path):
+    match = re.search(r'^#\s+(.+?)\s*$', text, re.MULTILINE)
+    if match:
+        return match.group(1)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r'[_-]+', ' ', name).title()
+
+
+def _infer_category(text):
+    text_lower = text.lower()
+    counts = {
+        category: sum(text_lower.count(keyword) for keyword in keywords)
+        for category, keywords in CATEGORY_KEYWORDS.items()
+    }
+    category, hits = max(counts.items(), key=lambda item: item[1])
+    return category if hits else DEFAULT_CATEGORY
+
+
+def load_manifest(manifest_path, collection=DEFAULT_COLLECTION):
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    entries = manifest["documents"] if isinstance(manifest, dict) else manifest
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    specs = []
+    for entry in entries:
+        specs.append({
+            "path": os.path.join(base_dir, entry["file"]),
+            "key": f"{collection}/{entry['file']}",
+            "source": entry.get("source"),
+            "category": entry.get("category"),
+            "title": entry.get("title"),
+            "state_relevance": entry.get("state_relevance"),
+            "business_type_relevance": entry.get("business_type_relevance"),
+        })
+    return specs
+
+
+def discover_documents(directory, collection=DEFAULT_COLLECTION):
+    specs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(DOCUMENT_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            specs.append({
+                "path": path,
+                "key": f"{collection}/{os.path.relpath(path, directory)}",
+                "source": None,
+                "category": None,
+                "title": None,
+                "state_relevance": None,
+                "business_type_relevance": None,
+            })
+    return specs
+
+
+def _init_worker(states, business_types):
+    # Spawned workers don't inherit the parent's tagger, so configure it from the same vocabularies.
+    if states is not None:
+        configure_tagger(states, business_types)
+
+
+def _prepare_document(spec):
+    # Returns (spec, None, None) with spec["error"] set if the document can't be read or chunked,
+    # so one bad file doesn't abort the batches after it.
+    spec = dict(spec)
+    try:
+        with open(spec["path"], "r") as f:
+            text = f.read()
+
+        spec["source"] = spec["source"] or DEFAULT_SOURCE
+        spec["title"] = spec["title"] or _infer_title(text, spec["path"])
+        spec["category"] = spec["category"] or _infer_category(text)
+
+        content_hash = document_hash(spec, text)
+        if content_hash == spec.get("known_hash"):
+            return spec, content_hash, None
+        return spec, content_hash, prepare_chunks(spec["title"], text)
+    except Exception as e:
+        spec["error"] = str(e)
+        return spec, None, None
+
+
+def _flush(conn, pending, collection):
+    rows = []
+    for spec, _, chunks in pending:
+        delete_document_chunks(conn, spec["key"])
+        rows.extend(
+            (spec["source"], spec["category"], spec["title"], spec["state_relevance"],
+             spec["business_type_relevance"], spec["key"], chunk)
+            for chunk in chunks
+        )
+    insert_chunk_rows(conn, rows)
+    upsert_document_hashes(
+        conn,
+        [(spec["key"], content_hash, len(chunks)) for spec, content_hash, chunks in pending],
+        collection=collection
+    )
+    # Bumped in the same transaction, so web workers reload for every batch that was committed.
+    bump_corpus_version(conn)
+    conn.commit()
+    return len(rows)
+
+
+def bulk_ingest(path, collection=DEFAULT_COLLECTION, workers=INGEST_WORKERS,
+                batch_chunks=INGEST_BATCH_CHUNKS, prune=False):
+    start = time.perf_counter()
+    if os.path.isdir(path):
+        specs = discover_documents(path, collection)
+    else:
+        specs = load_manifest(path, collection)
+
+    stats = {"documents": 0, "chunks": 0, "skipped": 0, "failed": 0, "removed": 0}
+
+    with connection("rag") as conn:
+        known = get_document_hashes(conn, collection)
+        for spec in specs:
+            spec["known_hash"] = known.get(spec["key"])
+
+        pending = []
+        pending_chunks = 0
+
+        def flush():
+            nonlocal pending, pending_chunks
+            try:
+                stats["chunks"] += _flush(conn, pending, collection)
+                stats["documents"] += len(pending)
+            except Exception as e:
+                logger.error(f"Failed to load batch of {len(pending)} documents: {e}")
+                conn.rollback()
+                stats["failed"] += len(pending)
+            pending = []
+            pending_chunks = 0
+
+        tagger = get_tagger()
+        initargs = (tagger.states, tagger.business_types) if tagger else (None, None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            for spec, content_hash, chunks in executor.map(_prepare_document, specs, chunksize=8):
+                if content_hash is None:
+                    logger.error(f"Failed to read document '{spec['key']}': {spec['error']}")
+                    stats["failed"] += 1
+                    continue
+                if chunks is None:
+                    stats["skipped"] += 1
+                    continue
+                pending.append((spec, content_hash, chunks))
+                pending_chunks += len(chunks)
+                if pending_chunks >= batch_chunks:
+                    flush()
+        if pending:
+            flush()
+
+        if prune:
+            for document_key in known.keys() - {spec["key"] for spec in specs}:
+                try:
+                    remove_document(conn, document_key)
+                    bump_corpus_version(conn)
+                    conn.commit()
+                    stats["removed"] += 1
+                except Exception as e:
+                    logger.error(f"Failed to remove document '{document_key}': {e}")
+                    conn.rollback()
+
+        if stats["documents"] or stats["removed"]:
+            reload_indexes(conn)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["docs_per_second"] = round(stats["documents"] / elapsed, 1) if elapsed else 0.0
+    stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 1) if elapsed else 0.0
+    logger.info(
+        f"Ingested {stats['documents']} documents ({stats['chunks']} chunks) in {stats['seconds']}s: "
+        f"{stats['docs_per_second']} docs/s, {stats['chunks_per_second']} chunks/s "
+        f"({stats['skipped']} unchanged, {stats['failed']} failed, {stats['removed']} removed)"
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load documents into the RAG corpus.")
+    parser.add_argument("path", help="directory of .md/.txt files or a JSON manifest")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION,
+                        help="name used to track content hashes for this corpus")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="chunking processes (default: CPU count)")
+    parser.add_argument("--batch-chunks", type=int, default=INGEST_BATCH_CHUNKS,
+                        help="chunks per insert transaction")
+    parser.add_argument("--prune", action="store_true",
+                        help="remove documents of this collection that are no longer present")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    configure_tagger(US_STATES, BOARD_SUGGESTIONS)
+    stats = bulk_ingest(args.path, args.collection, args.workers, args.batch_chunks, args.prune)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+
+from data.chunking import _units
+from data.rag import _tokenize
+
+PASSAGES_ENABLED = os.environ.get("RAG_PASSAGES", "1").lower() not in ("0", "false", "no")
+PASSAGE_WORD_BUDGET = int(os.environ.get("RAG_PASSAGE_WORDS", "80"))
+PASSAGE_WINDOW_SENTENCES = int(os.environ.get("RAG_PASSAGE_WINDOW", "3"))
+PASSAGE_SEPARATOR = " … "
+
+
+def _windows(units, max_sentences):
+    for start in range(len(units)):
+        for end in range(start + 1, min(start + max_sentences, len(units)) + 1):
+            yield start, end
+
+
+def _score(query_terms, tokens):
+    matched = set(tokens) & query_terms
+    if not matched:
+        return 0.0
+    return len(matched) + 0.25 * sum(1 for t in tokens if t in matched)
+
+
+def extract_passages(text, query_text, word_budget=PASSAGE_WORD_BUDGET, max_sentences=PASSAGE_WINDOW_SENTENCES):
+    if len(text.split()) <= word_budget:
+        return text
+
+    units = [unit for unit, _ in _units(text)]
+    unit_words = [len(unit.split()) for unit in units]
+    unit_tokens = [_tokenize(unit) for unit in units]
+    query_terms = set(_tokenize(query_text))
+
+    scored = []
+    for start, end in _windows(units, max_sentences):
+        words = sum(unit_words[start:end])
+        if words > word_budget and end - start > 1:
+            continue
+        score = _score(query_terms, [t for tokens in unit_tokens[start:end] for t in tokens])
+        if score > 0:
+            scored.append((score / (1.0 + 0.01 * words), start, end, words))
+    scored.sort(key=lambda w: (-w[0], w[1]))
+
+    selected = []
+    used = set()
+    remaining = word_budget
+    for _, start, end, words in scored:
+        if words > remaining or used.intersection(range(start, end)):
+            continue
+        selected.append((start, end))
+        used.update(range(start, end))
+        remaining -= words
+
+    if not selected:
+        # Nothing matched the query; fall back to the opening of the chunk.
+        end = 0
+        while end < len(units) and (end == 0 or sum(unit_words[:end + 1]) <= word_budget):
+            end += 1
+        selected = [(0, end)]
+
+    passages = []
+    last_end = None
+    for start, end in sorted(selected):
+        if start == last_end:
+            passages[-1] += " " + " ".join(units[start:end])
+        else:
+            passages.append(" ".join(units[start:end]))
+        last_end = end
+    return PASSAGE_SEPARATOR.join(passages)
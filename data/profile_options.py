@@ -0,0 +1,83 @@
+US_STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado",
+    "Connecticut", "Delaware", "Florida", "Georgia", "Hawaii", "Idaho",
+    "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky", "Louisiana",
+    "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota",
+    "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada",
+    "New Hampshire", "New Jersey", "New Mexico", "New York",
+    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon",
+    "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
+    "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington",
+    "West Virginia", "Wisconsin", "Wyoming"
+]
+
+BOARD_SUGGESTIONS = {
+    "Row Crop Farm": {
+        "recommended": ["agronomist", "commodity_risk"],
+        "tip": "Row crop operations benefit greatly from an Agronomist for crop planning and soil health, and a Commodity Risk Advisor to manage grain market exposure and hedge positions."
+    },
+    "Livestock Operation": {
+        "recommended": ["livestock", "commodity_risk"],
+        "tip": "Livestock operations should consider a Livestock & Animal Systems Advisor for herd management and animal health, and a Commodity Risk Advisor to manage feed cost volatility."
+    },
+    "Mixed Farming": {
+        "recommended": ["agronomist", "livestock", "commodity_risk"],
+        "tip": "Mixed operations juggle crops and livestock — an Agronomist, Livestock Advisor, and Commodity Risk Advisor together give you full coverage across your diversified operation."
+    },
+    "Dairy Operation": {
+        "recommended": ["livestock", "commodity_risk"],
+        "tip": "Dairy operations benefit from a Livestock & Animal Systems Advisor for herd health and production, plus a Commodity Risk Advisor to manage milk and feed price risk."
+    },
+    "Specialty Crop / Horticulture": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Specialty crop growers benefit from an Agronomist for crop-specific guidance and a Sustainability Advisor to explore certifications like organic or GAP that can boost margins."
+    },
+    "Vineyard / Winery": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Vineyards and wineries benefit from an Agronomist for viticulture expertise and a Sustainability Advisor for sustainable growing certifications that resonate with consumers."
+    },
+    "Orchard": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Orchard operations benefit from an Agronomist for tree crop management and a Sustainability Advisor to explore organic or conservation certifications."
+    },
+    "Nursery / Greenhouse": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Nursery and greenhouse operations benefit from an Agronomist for plant production expertise and a Sustainability Advisor for energy efficiency and environmental certifications."
+    },
+    "Ag Equipment Dealer / Service": {
+        "recommended": [],
+        "tip": "Equipment dealers may not need the production-focused optional advisors, but consider the Sustainability Advisor if you're selling precision ag or conservation equipment."
+    },
+    "Ag Input Supplier": {
+        "recommended": ["agronomist"],
+        "tip": "Input suppliers can benefit from an Agronomist to better understand the technical needs of your farming customers and provide informed product recommendations."
+    },
+    "Grain Elevator / Storage": {
+        "recommended": ["commodity_risk"],
+        "tip": "Grain elevators and storage operations deal directly with commodity markets — a Commodity Risk Advisor is highly recommended for basis management and hedging strategies."
+    },
+    "Food Processing / Packing": {
+        "recommended": ["sustainability"],
+        "tip": "Food processors benefit from a Sustainability Advisor for certifications, waste reduction, and meeting retailer sustainability requirements."
+    },
+    "Ag Tech / Precision Ag": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Ag tech companies benefit from an Agronomist to ground your solutions in production reality, and a Sustainability Advisor to align with growing ESG and carbon market opportunities."
+    },
+    "Ag Finance / Lending": {
+        "recommended": ["commodity_risk"],
+        "tip": "Ag lenders benefit from a Commodity Risk Advisor to better understand the commodity risk exposure of your borrowers."
+    },
+    "Ag Consulting": {
+        "recommended": ["agronomist", "sustainability"],
+        "tip": "Ag consultants benefit from an Agronomist and Sustainability Advisor to broaden the expertise you can offer your clients."
+    },
+    "Cooperative": {
+        "recommended": ["commodity_risk", "agronomist"],
+        "tip": "Cooperatives can benefit from a Commodity Risk Advisor for member grain marketing programs and an Agronomist to support member production advice."
+    },
+    "Other Ag Business": {
+        "recommended": [],
+        "tip": "Review the optional advisors and add any that align with your specific business needs. You can always change your board later."
+    }
+}
@@ -0,0 +1,153 @@
+import os
+import logging
+
+from data.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000"))
+MIN_SECTION_TOKENS = 24
+MESSAGE_OVERHEAD_TOKENS = 4
+TRIM_MARKER = " …"
+# History is dropped in whole blocks of messages (user/assistant pairs), so the start of the
+# conversation only moves every few turns instead of on every over-budget turn.
+HISTORY_TRIM_BLOCK = 6
+# Share of the budget kept free for the per-session and per-question sections once a prompt is
+# over budget. The prefix is cut to the rest of the budget, which depends only on the prefix itself,
+# so every over-budget question gets the same prefix text.
+QUESTION_RESERVE_SHARE = 0.35
+
+# name: (priority, max share of the budget, in cached prefix). Sections with the highest priority
+# number are trimmed first; a priority of None is never trimmed. Shares only apply to the sections
+# outside the prefix, and only once the prompt is over budget.
+SECTION_POLICIES = {
+    "persona": (None, None, True),
+    "response_format": (None, None, True),
+    "guidance": (None, None, True),
+    "state_focus": (None, None, True),
+    "business": (None, None, False),
+    "training_full": (1, None, True),
+    "state_data": (2, None, True),
+    "prices": (3, None, True),
+    "seasonal": (3, None, True),
+    "financial_analysis": (4, 0.20, False),
+    "records": (5, 0.10, False),
+    "history": (6, 0.30, False),
+    "training": (7, 0.30, False),
+    "rag": (8, 0.25, False),
+}
+DEFAULT_POLICY = (5, 0.20, False)
+
+
+def _truncate_words(text, max_tokens):
+    words = text.split(" ")
+    keep = int(len(words) * max_tokens / max(estimate_tokens(text), 1))
+    while keep > 0 and estimate_tokens(" ".join(words[:keep])) > max_tokens:
+        keep -= 1
+    return " ".join(words[:keep])
+
+
+class PromptSection:
+
+    def __init__(self, name, units, costs, keep="head", joiner="\n", block=1):
+        self.name = name
+        self.units = list(units)
+        self.costs = list(costs)
+        self.keep = keep
+        self.joiner = joiner
+        self.block = block
+        self.priority, self.max_share, self.in_prefix = SECTION_POLICIES.get(name, DEFAULT_POLICY)
+        self.trimmed = False
+
+    @classmethod
+    def from_text(cls, name, text):
+        units = text.split("\n") if text else []
+        return cls(name, units, [estimate_tokens(u) for u in units])
+
+    @classmethod
+    def from_messages(cls, name, messages):
+        costs = [estimate_tokens(m.get("content")) + MESSAGE_OVERHEAD_TOKENS for m in messages]
+        return cls(name, messages, costs, keep="tail", block=HISTORY_TRIM_BLOCK)
+
+    @property
+    def tokens(self):
+        return sum(self.costs)
+
+    @property
+    def text(self):
+        return self.joiner.join(self.units)
+
+    def drop(self):
+        self.units, self.costs = [], []
+        self.trimmed = True
+
+    def trim_to(self, max_tokens):
+        if self.tokens <= max_tokens:
+            return
+        order = range(len(self.units)) if self.keep == "head" else range(len(self.units) - 1, -1, -1)
+        kept, used = [], 0
+        for i in order:
+            if used + self.costs[i] > max_tokens:
+                # Text sections keep as much of the first line that doesn't fit as the budget allows.
+                if self.keep == "head" and max_tokens - used >= MIN_SECTION_TOKENS:
+                    partial = _truncate_words(self.units[i], max_tokens - used)
+                    if partial:
+                        kept.append((i, partial, estimate_tokens(partial)))
+                break
+            kept.append((i, self.units[i], self.costs[i]))
+            used += self.costs[i]
+        if self.block > 1:
+            dropped = len(self.units) - len(kept)
+            dropped = -(-dropped // self.block) * self.block
+            kept = kept[:max(len(self.units) - dropped, 0)]
+        kept.sort()
+        self.trimmed = True
+        if sum(cost for _, _, cost in kept) < MIN_SECTION_TOKENS:
+            self.drop()
+            return
+        self.units = [unit for _, unit, _ in kept]
+        self.costs = [cost for _, _, cost in kept]
+        if self.keep == "head":
+            self.units[-1] += TRIM_MARKER
+
+
+def _shed(sections, total, budget):
+    for section in sorted(sections, key=lambda s: s.priority, reverse=True):
+        if total <= budget:
+            break
+        current = section.tokens
+        section.trim_to(max(current - (total - budget), 0))
+        total -= current - section.tokens
+    return total
+
+
+def fit_to_budget(sections, budget=PROMPT_TOKEN_BUDGET, label="prompt"):
+    before = sum(s.tokens for s in sections)
+    trimmable = [s for s in sections if s.priority is not None]
+    prefix = [s for s in trimmable if s.in_prefix]
+    rest = [s for s in trimmable if not s.in_prefix]
+
+    if before <= budget:
+        logger.debug(f"{label}: {before} tokens (budget {budget})")
+        return sections
+
+    # The prefix limit doesn't depend on the question, so over-budget prompts share their prefix
+    # text and provider-side prompt caching keeps hitting.
+    _shed(prefix, sum(s.tokens for s in prefix), int(budget * (1 - QUESTION_RESERVE_SHARE)))
+
+    # Then hold the per-session and per-question sections to their share, and shed them from the
+    # lowest priority up; the prefix is only cut further if that still isn't enough.
+    for section in rest:
+        section.trim_to(int(budget * section.max_share))
+    total = _shed(rest, sum(s.tokens for s in sections), budget)
+    if total > budget:
+        logger.warning(f"{label}: still {total} tokens over a budget of {budget}; trimming the cached prefix")
+        total = _shed(prefix, total, budget)
+
+    dropped = [s.name for s in sections if s.trimmed and not s.units]
+    trimmed = [s.name for s in sections if s.trimmed and s.units]
+    logger.info(
+        f"{label}: {before} -> {total} tokens (budget {budget}); "
+        f"trimmed {', '.join(trimmed) or 'none'}; dropped {', '.join(dropped) or 'none'}"
+    )
+    return sections
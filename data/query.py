@@ -1,62 +1,149 @@
 import os
+import re
 import logging
-import psycopg2
-from psycopg2 import pool
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Future
 from psycopg2.extras import RealDictCursor
 
+from data.db import connection
+from data.reference_snapshot import get_snapshot
+
 logger = logging.getLogger(__name__)
 
-_pool = None
+# "bullets" renders each row as labelled lines; "table" renders a header row and one pipe-separated line per row.
+SECTION_FORMATS = {
+    "programs": os.environ.get("REFERENCE_FORMAT_PROGRAMS", "bullets"),
+    "commodities": os.environ.get("REFERENCE_FORMAT_COMMODITIES", "bullets"),
+}
+TABLE_FIELD_CHARS = int(os.environ.get("REFERENCE_TABLE_FIELD_CHARS", "80"))
+TABLE_URL_CHARS = 32
+
+
+# Set for the duration of a request; worker threads see it when submitted through copy_context().run.
+_query_memo = contextvars.ContextVar("query_memo", default=None)
+
+
+class QueryMemo:
 
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-def _get_pool():
-    global _pool
-    if _pool is None or _pool.closed:
-        _pool = pool.ThreadedConnectionPool(1, 10, os.environ["DATABASE_URL"])
-    return _pool
+    def fetch(self, key, run):
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = self._results[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(run())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
 
 
-def _query(sql, params=None):
-    p = _get_pool()
-    conn = p.getconn()
+@contextmanager
+def request_memo():
+    memo = _query_memo.get()
+    if memo is not None:
+        yield memo
+        return
+    memo = QueryMemo()
+    token = _query_memo.set(memo)
     try:
+        yield memo
+    finally:
+        _query_memo.reset(token)
+        logger.debug(f"Request query memo: {memo.misses} queries, {memo.hits} repeats served from memo")
+
+
+def _memo_key(sql, params):
+    if isinstance(params, dict):
+        return sql, tuple(sorted(params.items()))
+    return sql, tuple(params) if params is not None else None
+
+
+def _run_query(sql, params):
+    with connection("reference") as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(sql, params)
             return cur.fetchall()
+
+
+def _query(sql, params=None, strict=False):
+    # strict callers get the database error instead of an empty result, so they can tell
+    # "no rows" apart from "database unavailable".
+    memo = _query_memo.get()
+    try:
+        if memo is None:
+            return _run_query(sql, params)
+        return memo.fetch(_memo_key(sql, params), lambda: _run_query(sql, params))
     except Exception as e:
         logger.warning(f"Database query failed: {e}")
-        conn.reset()
+        if strict:
+            raise
         return []
-    finally:
-        p.putconn(conn)
 
 
-def get_state_profile(state_name):
-    rows = _query("SELECT * FROM state_ag_profiles WHERE state_name = %s", (state_name,))
-    if not rows:
-        return None
-    row = rows[0]
+def _real(value):
+    # REAL columns read through row_to_json come back as ints when whole (56.0 -> 56); print them
+    # the way a plain cursor returns them.
+    return float(value) if isinstance(value, int) else value
+
+
+def _format_state_profile(row):
     return (
         f"STATE AGRICULTURAL PROFILE — {row['state_name']} ({row['abbreviation']})\n"
         f"USDA Region: {row['usda_region']}\n"
         f"Climate Zones: {row['climate_zones']}\n"
         f"Growing Season: {row['growing_season_start']} to {row['growing_season_end']}\n"
-        f"Annual Precipitation: {row['annual_precipitation_inches']} inches\n"
+        f"Annual Precipitation: {_real(row['annual_precipitation_inches'])} inches\n"
         f"Top Commodities: {row['top_commodities']}\n"
         f"Total Farms: {row['total_farms']:,}\n"
         f"Average Farm Size: {row['avg_farm_size_acres']} acres\n"
         f"Total Ag Revenue: {row['total_ag_revenue']}\n"
-        f"Ag % of GDP: {row['ag_percentage_of_gdp']}\n"
+        f"Ag % of GDP: {_real(row['ag_percentage_of_gdp'])}\n"
         f"Primary Soil Types: {row['primary_soil_types']}\n"
         f"Hardiness Zones: {row['hardiness_zones']}"
     )
 
 
-def get_state_regulations(state_name):
-    rows = _query("SELECT * FROM state_ag_regulations WHERE state_name = %s", (state_name,))
-    if not rows:
+def _snapshot_row(table, key, sql):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return getattr(snapshot, table).get(key)
+    rows = _query(sql, (key,))
+    return rows[0] if rows else None
+
+
+def _snapshot_rows(table, key, sql, strict=False):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return getattr(snapshot, table).get(key, [])
+    return _query(sql, (key,), strict=strict)
+
+
+def get_growing_season_start(state_name):
+    row = _snapshot_row('profiles', state_name, "SELECT * FROM state_ag_profiles WHERE state_name = %s")
+    return row.get('growing_season_start') if row else None
+
+
+def get_state_profile(state_name):
+    row = _snapshot_row('profiles', state_name, "SELECT * FROM state_ag_profiles WHERE state_name = %s")
+    if not row:
         return None
-    row = rows[0]
+    return _format_state_profile(row)
+
+
+def _format_state_regulations(row):
     return (
         f"STATE REGULATIONS — {row['state_name']}\n"
         f"Water Rights: {row['water_rights_doctrine']}\n"
@@ -69,13 +156,48 @@ def get_state_regulations(state_name):
     )
 
 
-def get_state_programs(state_name):
-    rows = _query(
-        "SELECT * FROM state_financial_programs WHERE state_name = %s ORDER BY program_type, program_name",
-        (state_name,)
-    )
-    if not rows:
+def get_state_regulations(state_name):
+    row = _snapshot_row('regulations', state_name, "SELECT * FROM state_ag_regulations WHERE state_name = %s")
+    if not row:
         return None
+    return _format_state_regulations(row)
+
+
+def _abbreviate_url(url):
+    if not url:
+        return ""
+    url = re.sub(r'^https?://(www\.)?', '', url).rstrip('/')
+    if len(url) <= TABLE_URL_CHARS:
+        return url
+    return url.split('/', 1)[0] + '/…'
+
+
+def _table_cell(value, limit=TABLE_FIELD_CHARS):
+    text = " ".join(str(value).split()).replace("|", "/") if value is not None else ""
+    if len(text) > limit:
+        text = text[:limit - 1].rstrip() + "…"
+    return text
+
+
+def _format_table(title, headers, rows):
+    lines = [title, " | ".join(headers)]
+    lines.extend(" | ".join(_table_cell(value) for value in row) for row in rows)
+    return "\n".join(lines)
+
+
+def _format_state_programs(state_name, rows, style=None):
+    if (style or SECTION_FORMATS["programs"]) == "table":
+        return _format_table(
+            f"FINANCIAL PROGRAMS — {state_name}",
+            ["Program", "Type", "Agency", "Eligibility", "Max Amount", "Description", "Website"],
+            [
+                (row['program_name'], row['program_type'], row['administering_agency'],
+                 row['eligibility_summary'], row['max_amount'], row['description'],
+                 _abbreviate_url(row['website_url']))
+                for row in rows
+            ]
+        )
+
     lines = [f"FINANCIAL PROGRAMS — {state_name}"]
     for row in rows:
         lines.append(
@@ -89,13 +211,29 @@ def get_state_programs(state_name):
     return "\n".join(lines)
 
 
-def get_state_commodities(state_name):
-    rows = _query(
-        "SELECT * FROM state_commodities WHERE state_name = %s ORDER BY state_rank_national",
-        (state_name,)
+def get_state_programs(state_name):
+    rows = _snapshot_rows(
+        'programs', state_name,
+        "SELECT * FROM state_financial_programs WHERE state_name = %s ORDER BY program_type, program_name"
     )
     if not rows:
         return None
+    return _format_state_programs(state_name, rows)
+
+
+def _format_state_commodities(state_name, rows, style=None):
+    if (style or SECTION_FORMATS["commodities"]) == "table":
+        return _format_table(
+            f"TOP COMMODITIES — {state_name}",
+            ["Commodity", "Category", "National Rank", "Value", "Price", "Scale", "Trend"],
+            [
+                (row['commodity_name'], row['commodity_category'], f"#{row['state_rank_national']}",
+                 row['annual_production_value'], row['avg_price_per_unit'],
+                 row['acreage_or_head_count'], row['trend'])
+                for row in rows
+            ]
+        )
+
     lines = [f"TOP COMMODITIES — {state_name}"]
     for row in rows:
         trend_str = f" (trend: {row['trend']})" if row['trend'] else ""
@@ -109,11 +247,18 @@ def get_state_commodities(state_name):
     return "\n".join(lines)
 
 
-def get_business_benchmarks(business_type):
-    rows = _query("SELECT * FROM business_type_benchmarks WHERE business_type = %s", (business_type,))
+def get_state_commodities(state_name, strict=False):
+    rows = _snapshot_rows(
+        'commodities', state_name,
+        "SELECT * FROM state_commodities WHERE state_name = %s ORDER BY state_rank_national",
+        strict=strict
+    )
     if not rows:
         return None
-    row = rows[0]
+    return _format_state_commodities(state_name, rows)
+
+
+def _format_business_benchmarks(row):
     return (
         f"INDUSTRY BENCHMARKS — {row['business_type']}\n"
         f"Typical Startup Cost: {row['avg_startup_cost_range']}\n"
@@ -128,11 +273,16 @@ def get_business_benchmarks(business_type):
     )
 
 
-def get_extension_info(state_name):
-    rows = _query("SELECT * FROM extension_services WHERE state_name = %s", (state_name,))
-    if not rows:
+def get_business_benchmarks(business_type):
+    row = _snapshot_row(
+        'benchmarks', business_type, "SELECT * FROM business_type_benchmarks WHERE business_type = %s"
+    )
+    if not row:
         return None
-    row = rows[0]
+    return _format_business_benchmarks(row)
+
+
+def _format_extension_info(row):
     return (
         f"EXTENSION SERVICE — {row['state_name']}\n"
         f"University: {row['university_name']}\n"
@@ -143,34 +293,71 @@ def get_extension_info(state_name):
     )
 
 
-def get_advisor_context(state_name, business_type):
-    sections = []
+def get_extension_info(state_name):
+    row = _snapshot_row('extension', state_name, "SELECT * FROM extension_services WHERE state_name = %s")
+    if not row:
+        return None
+    return _format_extension_info(row)
+
+
+ADVISOR_CONTEXT_SQL = """
+    SELECT
+        (SELECT row_to_json(p) FROM state_ag_profiles p
+          WHERE p.state_name = %(state)s LIMIT 1) AS profile,
+        (SELECT json_agg(c ORDER BY c.state_rank_national) FROM state_commodities c
+          WHERE c.state_name = %(state)s) AS commodities,
+        (SELECT row_to_json(r) FROM state_ag_regulations r
+          WHERE r.state_name = %(state)s LIMIT 1) AS regulations,
+        (SELECT json_agg(f ORDER BY f.program_type, f.program_name) FROM state_financial_programs f
+          WHERE f.state_name = %(state)s) AS programs,
+        (SELECT row_to_json(e) FROM extension_services e
+          WHERE e.state_name = %(state)s LIMIT 1) AS extension,
+        (SELECT row_to_json(b) FROM business_type_benchmarks b
+          WHERE b.business_type = %(business_type)s LIMIT 1) AS benchmarks
+"""
 
-    if state_name:
-        profile = get_state_profile(state_name)
-        if profile:
-            sections.append(profile)
 
-        commodities = get_state_commodities(state_name)
-        if commodities:
-            sections.append(commodities)
+def _advisor_context_from_snapshot(snapshot, state_name, business_type):
+    return {
+        'profile': snapshot.profiles.get(state_name),
+        'commodities': snapshot.commodities.get(state_name),
+        'regulations': snapshot.regulations.get(state_name),
+        'programs': snapshot.programs.get(state_name),
+        'extension': snapshot.extension.get(state_name),
+        'benchmarks': snapshot.benchmarks.get(business_type),
+    }
 
-        regulations = get_state_regulations(state_name)
-        if regulations:
-            sections.append(regulations)
 
-        programs = get_state_programs(state_name)
-        if programs:
-            sections.append(programs)
+def _query_advisor_context(state_name, business_type):
+    rows = _query(ADVISOR_CONTEXT_SQL, {
+        "state": state_name or None,
+        "business_type": business_type or None,
+    }, strict=True)
+    return rows[0] if rows else None
 
-        extension = get_extension_info(state_name)
-        if extension:
-            sections.append(extension)
 
-    if business_type:
-        benchmarks = get_business_benchmarks(business_type)
-        if benchmarks:
-            sections.append(benchmarks)
+def get_advisor_context(state_name, business_type):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        row = _advisor_context_from_snapshot(snapshot, state_name, business_type)
+    else:
+        row = _query_advisor_context(state_name, business_type)
+    if not row:
+        return None
+
+    sections = []
+    if row['profile']:
+        sections.append(_format_state_profile(row['profile']))
+    if row['commodities']:
+        sections.append(_format_state_commodities(state_name, row['commodities']))
+    if row['regulations']:
+        sections.append(_format_state_regulations(row['regulations']))
+    if row['programs']:
+        sections.append(_format_state_programs(state_name, row['programs']))
+    if row['extension']:
+        sections.append(_format_extension_info(row['extension']))
+    if row['benchmarks']:
+        sections.append(_format_business_benchmarks(row['benchmarks']))
 
     if not sections:
         return None
@@ -1,19 +1,70 @@
 import os
 import re
+import json
+import hashlib
 import math
+import time
 import logging
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
+from contextlib import contextmanager
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from collections import Counter
 
+from data.cache import TTLCache
+from data.chunking import chunk_markdown, HEADING_SEPARATOR, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from data.db import connection
+from data.rag_index import InvertedIndex
+from data.tagging import get_tagger
+
 logger = logging.getLogger(__name__)
 
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "bm25")
+RAG_CHUNKER = os.environ.get("RAG_CHUNKER", "markdown")
+RAG_CANDIDATE_POOL = int(os.environ.get("RAG_CANDIDATE_POOL", "12"))
+CATEGORY_RERANK_BOOST = 1.5
+BUSINESS_TYPE_BOOST = 1.25
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE", "512"))
+RAG_CACHE_TTL_SECONDS = int(os.environ.get("RAG_CACHE_TTL_SECONDS", "900"))
+RAG_VERSION_CHECK_SECONDS = float(os.environ.get("RAG_VERSION_CHECK_SECONDS", "30"))
+
+CORPUS_VERSION_SQL = "SELECT version FROM rag_corpus_version"
+
 _idf_cache = {}
 _doc_count_cache = {}
 
+_index = None
+_index_lock = threading.Lock()
+_near_duplicates = None
+
+_search_cache = TTLCache(maxsize=RAG_CACHE_SIZE, ttl=RAG_CACHE_TTL_SECONDS)
+
+# Bumped in rag_corpus_version whenever chunks are added or removed, so processes that didn't make
+# the change (web workers after a CLI bulk ingest) know to rebuild their indexes.
+_corpus_version = None
+_corpus_checked_at = 0.0
+_corpus_lock = threading.Lock()
+
+VECTOR_STORE_DIR = os.environ.get(
+    "RAG_VECTOR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "vector_store")
+)
+
+_vector_index = None
+_vector_store = None
+_vector_index_lock = threading.Lock()
+# Set while the embeddings or the vector index may be behind the corpus because the vector backend
+# is not the configured one; the first vector search then backfills and rebuilds them.
+_vector_stale = True
+_vector_stale_lock = threading.Lock()
+
 
-def _get_connection():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+@contextmanager
+def _get_connection(conn=None):
+    if conn is not None:
+        yield conn
+        return
+    with connection("rag") as pooled:
+        yield pooled
 
 
 STOP_WORDS = {
@@ -30,6 +81,16 @@ STOP_WORDS = {
 }
 
 
+CATEGORY_KEYWORDS = {
+    'financial': ['loan', 'credit', 'finance', 'money', 'cost', 'budget', 'debt', 'grant', 'funding', 'investment', 'capital'],
+    'risk': ['insurance', 'risk', 'crop insurance', 'disaster', 'protection', 'coverage', 'loss', 'claim'],
+    'crop': ['crop', 'plant', 'seed', 'soil', 'harvest', 'yield', 'irrigation', 'fertilizer', 'pest', 'weed'],
+    'livestock': ['cattle', 'livestock', 'herd', 'animal', 'beef', 'dairy', 'poultry', 'feed', 'breeding', 'veterinary'],
+    'sustainability': ['conservation', 'sustainable', 'environment', 'carbon', 'organic', 'water quality', 'erosion', 'habitat'],
+    'marketing': ['market', 'sell', 'price', 'buyer', 'brand', 'direct', 'wholesale', 'value added', 'consumer'],
+}
+
+
 def _tokenize(text):
     words = re.findall(r'[a-z0-9]+', text.lower())
     return [w for w in words if w not in STOP_WORDS and len(w) > 2]
@@ -43,41 +104,58 @@ def _compute_tf(tokens):
     return {word: count / total for word, count in counts.items()}
 
 
-def _compute_relevance(query_tokens, doc_tokens, doc_category, query_text):
-    if not query_tokens or not doc_tokens:
+def _category_boost(doc_category, query_lower):
+    for kw in CATEGORY_KEYWORDS.get(doc_category, ()):
+        if kw in query_lower:
+            return 1.5
+    return 1.0
+
+
+def _relevance_boost(meta, query_lower, business_type=None):
+    boost = _category_boost(meta['category'], query_lower)
+    if business_type and meta['business_type_relevance'] == business_type:
+        boost *= BUSINESS_TYPE_BOOST
+    return boost
+
+
+def _chunk_label(title, heading_path=None):
+    return f"{title} {heading_path}" if heading_path else title
+
+
+def _term_vector(chunk, label):
+    tokens = _tokenize(chunk + ' ' + label)
+    return dict(Counter(tokens)), len(tokens)
+
+
+def _row_term_vector(row):
+    if row.get('term_vector') is not None:
+        return row['term_vector'], row['token_count']
+    return _term_vector(row['chunk_text'], _chunk_label(row['title'], row.get('heading_path')))
+
+
+def _compute_relevance(query_tokens, doc_terms, doc_category, query_text, doc_length=None):
+    if not query_tokens or not doc_terms:
         return 0.0
 
+    if not isinstance(doc_terms, dict):
+        doc_terms = Counter(doc_terms)
+    if not doc_length:
+        doc_length = sum(doc_terms.values())
+
     query_tf = _compute_tf(query_tokens)
-    doc_tf = _compute_tf(doc_tokens)
 
-    shared_terms = set(query_tokens) & set(doc_tokens)
+    shared_terms = set(query_tokens) & doc_terms.keys()
     if not shared_terms:
         return 0.0
 
     score = 0.0
     for term in shared_terms:
-        score += query_tf.get(term, 0) * doc_tf.get(term, 0)
+        score += query_tf.get(term, 0) * doc_terms[term] / doc_length
 
     coverage = len(shared_terms) / len(set(query_tokens))
     score = score * (0.5 + 0.5 * coverage)
 
-    category_keywords = {
-        'financial': ['loan', 'credit', 'finance', 'money', 'cost', 'budget', 'debt', 'grant', 'funding', 'investment', 'capital'],
-        'risk': ['insurance', 'risk', 'crop insurance', 'disaster', 'protection', 'coverage', 'loss', 'claim'],
-        'crop': ['crop', 'plant', 'seed', 'soil', 'harvest', 'yield', 'irrigation', 'fertilizer', 'pest', 'weed'],
-        'livestock': ['cattle', 'livestock', 'herd', 'animal', 'beef', 'dairy', 'poultry', 'feed', 'breeding', 'veterinary'],
-        'sustainability': ['conservation', 'sustainable', 'environment', 'carbon', 'organic', 'water quality', 'erosion', 'habitat'],
-        'marketing': ['market', 'sell', 'price', 'buyer', 'brand', 'direct', 'wholesale', 'value added', 'consumer'],
-    }
-
-    query_lower = query_text.lower()
-    if doc_category in category_keywords:
-        for kw in category_keywords[doc_category]:
-            if kw in query_lower:
-                score *= 1.5
-                break
-
-    return score
+    return score * _category_boost(doc_category, query_text.lower())
 
 
 def chunk_text(text, chunk_size=500, overlap=100):
@@ -98,6 +176,12 @@ def chunk_text(text, chunk_size=500, overlap=100):
     return chunks
 
 
+def split_document(text):
+    if RAG_CHUNKER == "words":
+        return [{"text": chunk, "heading_path": None} for chunk in chunk_text(text)]
+    return chunk_markdown(text)
+
+
 def create_rag_documents_table(conn):
     with conn.cursor() as cur:
         cur.execute("""
@@ -112,88 +196,619 @@ def create_rag_documents_table(conn):
                 business_type_relevance VARCHAR
             );
         """)
+        cur.execute("""
+            ALTER TABLE rag_documents
+                ADD COLUMN IF NOT EXISTS term_vector JSONB,
+                ADD COLUMN IF NOT EXISTS token_count INTEGER,
+                ADD COLUMN IF NOT EXISTS embedding_model VARCHAR,
+                ADD COLUMN IF NOT EXISTS heading_path VARCHAR,
+                ADD COLUMN IF NOT EXISTS document_key VARCHAR,
+                ADD COLUMN IF NOT EXISTS minhash TEXT;
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS rag_documents_document_key_idx
+                ON rag_documents (document_key);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS rag_documents_state_relevance_idx
+                ON rag_documents (state_relevance) WHERE state_relevance IS NOT NULL;
+        """)
+        # Business-type tags only boost ranking, so they no longer need filter indexes.
+        cur.execute("""
+            DROP INDEX IF EXISTS rag_documents_business_type_relevance_idx;
+            DROP INDEX IF EXISTS rag_documents_untagged_idx;
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS rag_documents_state_untagged_idx
+                ON rag_documents (category) WHERE state_relevance IS NULL;
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS rag_document_hashes (
+                document_key VARCHAR PRIMARY KEY,
+                content_hash VARCHAR NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW()
+            );
+        """)
+        cur.execute("""
+            ALTER TABLE rag_document_hashes
+                ADD COLUMN IF NOT EXISTS collection VARCHAR NOT NULL DEFAULT 'registry';
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS rag_corpus_version (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                version BIGINT NOT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+        cur.execute("""
+            ALTER TABLE rag_documents
+                ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(chunk_text, '')), 'B')
+                ) STORED;
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS rag_documents_search_vector_idx
+                ON rag_documents USING GIN (search_vector);
+        """)
     conn.commit()
 
 
-def store_document(source, category, title, text, state_relevance=None, business_type_relevance=None):
-    chunks = chunk_text(text)
-    conn = _get_connection()
+def backfill_term_vectors(conn):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id, title, heading_path, chunk_text FROM rag_documents WHERE term_vector IS NULL")
+        rows = cur.fetchall()
+        for row in rows:
+            vector, token_count = _term_vector(row['chunk_text'], _chunk_label(row['title'], row['heading_path']))
+            cur.execute(
+                "UPDATE rag_documents SET term_vector = %s, token_count = %s WHERE id = %s",
+                (Json(vector), token_count, row['id'])
+            )
+    conn.commit()
+    if rows:
+        logger.info(f"Backfilled term vectors for {len(rows)} RAG chunks")
+    return len(rows)
+
+
+def _embedding_text(chunk, label):
+    return f"{label}\n{chunk}"
+
+
+def _embed_chunks(chunks, title):
+    if RAG_BACKEND != "vector":
+        return None, [None] * len(chunks), None
     try:
-        with conn.cursor() as cur:
-            for chunk in chunks:
+        from data.embeddings import get_embedder, encode_vector
+        embedder = get_embedder()
+        vectors = embedder.embed([
+            _embedding_text(chunk["text"], _chunk_label(title, chunk["heading_path"])) for chunk in chunks
+        ])
+        return vectors, [encode_vector(v) for v in vectors], embedder.model_id
+    except Exception as e:
+        logger.warning(f"Failed to embed chunks for '{title}': {e}")
+        return None, [None] * len(chunks), None
+
+
+def backfill_embeddings(conn):
+    from data.embeddings import get_embedder, encode_vector
+
+    embedder = get_embedder()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """SELECT id, title, heading_path, chunk_text FROM rag_documents
+               WHERE embedding IS NULL OR embedding_model IS DISTINCT FROM %s""",
+            (embedder.model_id,)
+        )
+        rows = cur.fetchall()
+        if rows:
+            vectors = embedder.embed([
+                _embedding_text(row['chunk_text'], _chunk_label(row['title'], row['heading_path'])) for row in rows
+            ])
+            for row, vector in zip(rows, vectors):
                 cur.execute(
-                    """INSERT INTO rag_documents 
-                       (source, category, title, chunk_text, state_relevance, business_type_relevance)
-                       VALUES (%s, %s, %s, %s, %s, %s)""",
-                    (source, category, title, chunk, state_relevance, business_type_relevance)
+                    "UPDATE rag_documents SET embedding = %s, embedding_model = %s WHERE id = %s",
+                    (encode_vector(vector), embedder.model_id, row['id'])
                 )
-        conn.commit()
-        logger.info(f"Stored {len(chunks)} chunks for '{title}'")
-        return len(chunks)
+    conn.commit()
+    if rows:
+        logger.info(f"Embedded {len(rows)} RAG chunks with {embedder.model_id}")
+    return len(rows)
+
+
+def _chunk_meta(source, category, title, state_relevance, business_type_relevance):
+    return {
+        'source': source,
+        'category': category,
+        'title': title,
+        'state_relevance': state_relevance,
+        'business_type_relevance': business_type_relevance,
+    }
+
+
+def _build_near_duplicates(conn):
+    from data.dedup import NearDuplicateIndex, minhash_signature, decode_signature
+
+    duplicates = NearDuplicateIndex()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """SELECT id, minhash, CASE WHEN minhash IS NULL THEN chunk_text END AS chunk_text
+               FROM rag_documents ORDER BY id"""
+        )
+        for row in cur:
+            if row['minhash'] is not None:
+                signature = decode_signature(row['minhash'])
+            else:
+                signature = minhash_signature(row['chunk_text'])
+            duplicates.add(row['id'], signature)
+    logger.info(f"Found {len(duplicates.duplicate_of)} near-duplicate RAG chunks")
+    return duplicates
+
+
+def _get_near_duplicates(conn=None, rebuild=False):
+    global _near_duplicates
+    if _near_duplicates is None or rebuild:
+        with _get_connection(conn) as conn:
+            _near_duplicates = _build_near_duplicates(conn)
+    return _near_duplicates
+
+
+def _build_index(conn):
+    index = InvertedIndex()
+    duplicates = _get_near_duplicates(conn, rebuild=True)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """SELECT id, source, category, title, heading_path, term_vector, token_count,
+                      state_relevance, business_type_relevance,
+                      CASE WHEN term_vector IS NULL THEN chunk_text END AS chunk_text
+               FROM rag_documents"""
+        )
+        for row in cur:
+            if duplicates.is_duplicate(row['id']):
+                continue
+            vector, token_count = _row_term_vector(row)
+            index.add(
+                row['id'],
+                vector,
+                _chunk_meta(row['source'], row['category'], row['title'],
+                            row['state_relevance'], row['business_type_relevance']),
+                length=token_count
+            )
+    logger.info(
+        f"Built RAG inverted index: {len(index)} chunks, {len(index.postings)} terms "
+        f"({len(duplicates.duplicate_of)} near-duplicates collapsed)"
+    )
+    return index
+
+
+def _get_index(conn=None, rebuild=False):
+    global _index
+    if _index is not None and not rebuild:
+        return _index
+
+    with _index_lock:
+        if _index is not None and not rebuild:
+            return _index
+        with _get_connection(conn) as conn:
+            _index = _build_index(conn)
+        return _index
+
+
+def _canonical_rows(conn, rows):
+    duplicates = _get_near_duplicates(conn)
+    return [row for row in rows if not duplicates.is_duplicate(row['id'])]
+
+
+def _build_vector_index(conn):
+    from data.embeddings import get_embedder, decode_vector, VectorIndex
+
+    embedder = get_embedder()
+    index = VectorIndex(embedder.dim)
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """SELECT id, category, state_relevance, business_type_relevance, embedding
+               FROM rag_documents WHERE embedding_model = %s""",
+            (embedder.model_id,)
+        )
+        rows = _canonical_rows(conn, cur.fetchall())
+    index.add_many(
+        [row['id'] for row in rows],
+        [decode_vector(row['embedding']) for row in rows],
+        rows
+    )
+    logger.info(f"Built RAG vector index: {len(index)} chunks ({embedder.model_id})")
+    return index
+
+
+def _get_vector_store():
+    global _vector_store
+    if _vector_store is None:
+        from data.vector_store import VectorStore
+        _vector_store = VectorStore(VECTOR_STORE_DIR)
+    return _vector_store
+
+
+def _write_vector_store(conn, store):
+    from data.embeddings import get_embedder, decode_vector
+
+    embedder = get_embedder()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """SELECT id, category, state_relevance, business_type_relevance, embedding
+               FROM rag_documents WHERE embedding_model = %s ORDER BY id""",
+            (embedder.model_id,)
+        )
+        rows = _canonical_rows(conn, cur.fetchall())
+    store.write(
+        [row['id'] for row in rows],
+        (decode_vector(row['embedding']) for row in rows),
+        rows,
+        embedder.model_id,
+        embedder.dim
+    )
+
+
+def _get_stored_vector_index(conn=None, rebuild=False):
+    from data.embeddings import get_embedder
+
+    store = _get_vector_store()
+    model_id = get_embedder().model_id
+    index = None if rebuild else store.open(model_id)
+    if index is not None:
+        return index
+
+    with _vector_index_lock:
+        with _get_connection(conn) as conn:
+            _write_vector_store(conn, store)
+        return store.open(model_id)
+
+
+def _get_vector_index(conn=None, rebuild=False):
+    global _vector_index
+    if VECTOR_STORE_DIR:
+        return _get_stored_vector_index(conn, rebuild)
+
+    if _vector_index is not None and not rebuild:
+        return _vector_index
+
+    with _vector_index_lock:
+        if _vector_index is not None and not rebuild:
+            return _vector_index
+        with _get_connection(conn) as conn:
+            _vector_index = _build_vector_index(conn)
+        return _vector_index
+
+
+def prepare_chunks(title, text):
+    from data.dedup import minhash_signature, encode_signature
+
+    tagger = get_tagger()
+    chunks = split_document(text)
+    _, encoded, embedding_model = _embed_chunks(chunks, title)
+    prepared = []
+    for chunk, embedding in zip(chunks, encoded):
+        label = _chunk_label(title, chunk["heading_path"])
+        vector, token_count = _term_vector(chunk["text"], label)
+        state_tag, business_type_tag = tagger.tag(f"{label}\n{chunk['text']}") if tagger else (None, None)
+        prepared.append({
+            "heading_path": chunk["heading_path"],
+            "text": chunk["text"],
+            "term_vector": vector,
+            "token_count": token_count,
+            "embedding": embedding,
+            "embedding_model": embedding_model,
+            "minhash": encode_signature(minhash_signature(chunk["text"])),
+            "state_relevance": state_tag,
+            "business_type_relevance": business_type_tag,
+        })
+    return prepared
+
+
+def insert_chunk_rows(conn, rows):
+    # rows: (source, category, title, state_relevance, business_type_relevance, document_key, prepared chunk);
+    # document-level relevance overrides the chunk's own tags. Returns
+    # (id, term_vector, token_count, minhash, state_relevance, business_type_relevance) per chunk.
+    if not rows:
+        return []
+    rows = [
+        (source, category, title, state_relevance or chunk["state_relevance"],
+         business_type_relevance or chunk["business_type_relevance"], document_key, chunk)
+        for source, category, title, state_relevance, business_type_relevance, document_key, chunk in rows
+    ]
+    values = [
+        (source, category, title, chunk["heading_path"], chunk["text"], state_relevance,
+         business_type_relevance, Json(chunk["term_vector"]), chunk["token_count"],
+         chunk["embedding"], chunk["embedding_model"], document_key, chunk["minhash"])
+        for source, category, title, state_relevance, business_type_relevance, document_key, chunk in rows
+    ]
+    with conn.cursor() as cur:
+        ids = execute_values(
+            cur,
+            """INSERT INTO rag_documents
+               (source, category, title, heading_path, chunk_text, state_relevance, business_type_relevance,
+                term_vector, token_count, embedding, embedding_model, document_key, minhash)
+               VALUES %s RETURNING id""",
+            values,
+            page_size=500,
+            fetch=True
+        )
+    return [
+        (row[0], chunk["term_vector"], chunk["token_count"], chunk["minhash"], state_relevance, business_type_relevance)
+        for row, (_, _, _, state_relevance, business_type_relevance, _, chunk) in zip(ids, rows)
+    ]
+
+
+def _insert_chunks(conn, source, category, title, text, state_relevance=None, business_type_relevance=None,
+                   document_key=None):
+    return insert_chunk_rows(conn, [
+        (source, category, title, state_relevance, business_type_relevance, document_key, chunk)
+        for chunk in prepare_chunks(title, text)
+    ])
+
+
+def store_document(source, category, title, text, state_relevance=None, business_type_relevance=None):
+    try:
+        with _get_connection() as conn:
+            try:
+                stored = _insert_chunks(conn, source, category, title, text, state_relevance, business_type_relevance)
+                version = bump_corpus_version(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            _search_cache.clear()
+            _record_corpus_version(version)
+
+            if _index is not None:
+                from data.dedup import decode_signature
+
+                duplicates = _get_near_duplicates(conn)
+                for chunk_id, vector, token_count, minhash, chunk_state, chunk_business_type in stored:
+                    if duplicates.add(chunk_id, decode_signature(minhash)) is None:
+                        meta = _chunk_meta(source, category, title, chunk_state, chunk_business_type)
+                        _index.add(chunk_id, vector, meta, length=token_count)
+            _refresh_vector_index(conn)
+
+        logger.info(f"Stored {len(stored)} chunks for '{title}'")
+        return len(stored)
     except Exception as e:
         logger.error(f"Failed to store document: {e}")
-        conn.rollback()
         return 0
-    finally:
-        conn.close()
 
 
-def search_similar(query_text, top_k=5, category=None, state_name=None, business_type=None):
-    conn = _get_connection()
-    try:
-        conditions = []
-        params = []
+# State tags exclude chunks about other states. Business-type tags only rank matching chunks higher:
+# material about one business type is often still useful to related ones.
+def _matches_filters(meta, category=None, state_name=None):
+    if category and meta['category'] != category:
+        return False
+    if state_name and meta['state_relevance'] not in (None, state_name):
+        return False
+    return True
 
-        if category:
-            conditions.append("category = %s")
-            params.append(category)
 
-        if state_name:
-            conditions.append("(state_relevance IS NULL OR state_relevance = %s)")
-            params.append(state_name)
+def _fetch_chunks(conn, chunk_ids):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            "SELECT id, source, category, title, heading_path, chunk_text FROM rag_documents WHERE id = ANY(%s)",
+            (list(chunk_ids),)
+        )
+        return {row['id']: row for row in cur.fetchall()}
 
-        if business_type:
-            conditions.append("(business_type_relevance IS NULL OR business_type_relevance = %s)")
-            params.append(business_type)
 
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
+def _ranked_results(conn, ranked):
+    rows = _fetch_chunks(conn, [chunk_id for chunk_id, _ in ranked])
+    results = []
+    for chunk_id, score in ranked:
+        row = rows.get(chunk_id)
+        if row is None:
+            continue
+        results.append({
+            'id': row['id'],
+            'source': row['source'],
+            'category': row['category'],
+            'title': row['title'],
+            'heading_path': row['heading_path'],
+            'chunk_text': row['chunk_text'],
+            'similarity': score
+        })
+    return results
 
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                f"SELECT id, source, category, title, chunk_text FROM rag_documents WHERE {where_clause}",
-                params
-            )
-            rows = cur.fetchall()
 
-        if not rows:
-            return []
+def _search_bm25(conn, query_text, top_k, category=None, state_name=None, business_type=None):
+    query_tokens = _tokenize(query_text)
+    if not query_tokens:
+        return []
+
+    index = _get_index(conn)
+    query_lower = query_text.lower()
 
-        query_tokens = _tokenize(query_text)
-        if not query_tokens:
-            return []
+    def doc_filter(meta):
+        return _matches_filters(meta, category, state_name)
 
-        results = []
-        for row in rows:
-            doc_tokens = _tokenize(row['chunk_text'] + ' ' + row['title'])
-            score = _compute_relevance(query_tokens, doc_tokens, row['category'], query_text)
-            if score > 0:
-                results.append({
-                    'id': row['id'],
-                    'source': row['source'],
-                    'category': row['category'],
-                    'title': row['title'],
-                    'chunk_text': row['chunk_text'],
-                    'similarity': score
-                })
-
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        return results[:top_k]
+    def boost(meta):
+        return _relevance_boost(meta, query_lower, business_type)
+
+    ranked = index.search(query_tokens, top_k=top_k, doc_filter=doc_filter, boost=boost)
+    if not ranked:
+        return []
+
+    return _ranked_results(conn, ranked)
+
+
+def _search_sharded(conn, query_text, top_k, category=None, state_name=None, business_type=None):
+    from data.rag_shards import get_sharded_index
+
+    query_tokens = _tokenize(query_text)
+    if not query_tokens:
+        return []
+
+    sharded = get_sharded_index(_get_index(conn))
+    ranked = sharded.search(
+        query_tokens, top_k=top_k, category=category, state_name=state_name,
+        business_type=business_type, query_lower=query_text.lower()
+    )
+    if not ranked:
+        return []
+
+    return _ranked_results(conn, ranked)
+
+
+def _search_vector(conn, query_text, top_k, category=None, state_name=None, business_type=None):
+    if not query_text.strip():
+        return []
+
+    from data.embeddings import get_embedder
+
+    if _vector_stale:
+        _load_vector_index(conn)
+    index = _get_vector_index(conn)
+    ranked = index.search(
+        get_embedder().embed_one(query_text), top_k=top_k,
+        category=category, state_name=state_name, business_type=business_type
+    )
+    if not ranked:
+        return []
+
+    return _ranked_results(conn, ranked)
+
+
+def _filter_conditions(category=None, state_name=None):
+    conditions = []
+    params = []
+
+    if category:
+        conditions.append("category = %s")
+        params.append(category)
+
+    if state_name:
+        conditions.append("(state_relevance IS NULL OR state_relevance = %s)")
+        params.append(state_name)
+
+    return conditions, params
+
+
+def _search_fts(conn, query_text, top_k, category=None, state_name=None, business_type=None):
+    query_tokens = _tokenize(query_text)
+    if not query_tokens:
+        return []
 
+    query_lower = query_text.lower()
+    boosted = [c for c in CATEGORY_KEYWORDS if _category_boost(c, query_lower) > 1.0]
+    conditions, params = _filter_conditions(category, state_name)
+    conditions.insert(0, "search_vector @@ q.query")
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            f"""SELECT id, source, category, title, heading_path, chunk_text,
+                       ts_rank_cd(search_vector, q.query)
+                       * CASE WHEN category = ANY(%s) THEN 1.5 ELSE 1.0 END
+                       * CASE WHEN business_type_relevance = %s THEN %s ELSE 1.0 END AS similarity
+                FROM rag_documents, to_tsquery('english', %s) AS q(query)
+                WHERE {" AND ".join(conditions)}
+                ORDER BY similarity DESC
+                LIMIT %s""",
+            [boosted, business_type, BUSINESS_TYPE_BOOST, " | ".join(dict.fromkeys(query_tokens))]
+            + params + [top_k]
+        )
+        rows = cur.fetchall()
+
+    return [{
+        'id': row['id'],
+        'source': row['source'],
+        'category': row['category'],
+        'title': row['title'],
+        'heading_path': row['heading_path'],
+        'chunk_text': row['chunk_text'],
+        'similarity': float(row['similarity'])
+    } for row in rows]
+
+
+def _search_keyword(conn, query_text, top_k, category=None, state_name=None, business_type=None):
+    conditions, params = _filter_conditions(category, state_name)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+    query_tokens = _tokenize(query_text)
+    if not query_tokens:
+        return []
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            f"""SELECT id, category, title, heading_path, term_vector, token_count, business_type_relevance,
+                       CASE WHEN term_vector IS NULL THEN chunk_text END AS chunk_text
+                FROM rag_documents WHERE {where_clause}""",
+            params
+        )
+        rows = cur.fetchall()
+
+    if not rows:
+        return []
+
+    scored = []
+    for row in rows:
+        vector, token_count = _row_term_vector(row)
+        score = _compute_relevance(query_tokens, vector, row['category'], query_text, doc_length=token_count)
+        if business_type and row['business_type_relevance'] == business_type:
+            score *= BUSINESS_TYPE_BOOST
+        if score > 0:
+            scored.append((row['id'], score))
+
+    scored.sort(key=lambda x: x[1], reverse=True)
+    scored = scored[:top_k]
+    if not scored:
+        return []
+
+    return _ranked_results(conn, scored)
+
+
+SEARCH_BACKENDS = {
+    "bm25": _search_bm25,
+    "sharded": _search_sharded,
+    "keyword": _search_keyword,
+    "vector": _search_vector,
+    "fts": _search_fts,
+}
+
+
+def _search_cache_key(query_text, top_k, category, state_name, business_type, backend_name):
+    return (
+        tuple(sorted(set(_tokenize(query_text)))),
+        category, state_name, business_type, top_k, backend_name
+    )
+
+
+def search_cache_stats():
+    return _search_cache.stats()
+
+
+def search_similar(query_text, top_k=5, category=None, state_name=None, business_type=None, backend=None):
+    backend_name = backend or RAG_BACKEND
+    backend = SEARCH_BACKENDS.get(backend_name)
+    if backend is None:
+        logger.warning(f"Unknown RAG backend '{backend_name}', falling back to bm25")
+        backend = _search_bm25
+
+    cache_key = _search_cache_key(query_text, top_k, category, state_name, business_type, backend_name)
+    _check_corpus_version()
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    try:
+        with _get_connection() as conn:
+            # Over-fetch so dropping near-duplicates still leaves top_k results for the SQL backends,
+            # which rank every chunk rather than only the canonical ones.
+            results = backend(
+                conn, query_text, top_k * 2,
+                category=category, state_name=state_name, business_type=business_type
+            )
+            results = _canonical_rows(conn, results)[:top_k]
     except Exception as e:
         logger.error(f"RAG search failed: {e}")
         return []
-    finally:
-        conn.close()
+
+    _search_cache.set(cache_key, results)
+    return list(results)
 
 
 DOCUMENT_REGISTRY = [
@@ -260,65 +875,291 @@ DOCUMENT_REGISTRY = [
 ]
 
 
+def _update_vector_index(conn, force=True):
+    try:
+        embedded = backfill_embeddings(conn)
+        _get_vector_index(conn, rebuild=force or embedded > 0)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to build RAG vector index: {e}")
+        conn.rollback()
+        return False
+
+
+def _refresh_vector_index(conn, force=True):
+    global _vector_stale
+    if RAG_BACKEND != "vector":
+        _vector_stale = True
+        return
+    _vector_stale = not _update_vector_index(conn, force)
+
+
+def _load_vector_index(conn):
+    global _vector_stale
+    with _vector_stale_lock:
+        if _vector_stale:
+            _vector_stale = not _update_vector_index(conn)
+
+
+def document_hash(doc, text):
+    tagger = get_tagger()
+    payload = {
+        "chunker": [RAG_CHUNKER, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS],
+        "tagger": tagger.signature if tagger else None,
+        "source": doc["source"],
+        "category": doc["category"],
+        "title": doc["title"],
+        "text": text,
+    }
+    # Manifest entries can tag a whole document; leave the key out for untagged documents so their
+    # existing hashes still match.
+    relevance = [doc.get("state_relevance"), doc.get("business_type_relevance")]
+    if any(relevance):
+        payload["relevance"] = relevance
+    payload = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def delete_document_chunks(conn, document_key, source=None, title=None):
+    with conn.cursor() as cur:
+        # Rows seeded before content hashes were tracked have no document_key.
+        cur.execute(
+            """DELETE FROM rag_documents
+               WHERE document_key = %s OR (document_key IS NULL AND source = %s AND title = %s)
+               RETURNING id""",
+            (document_key, source, title)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def _sync_document(conn, doc, text, content_hash):
+    removed = delete_document_chunks(conn, doc["file"], doc["source"], doc["title"])
+    stored = _insert_chunks(conn, doc["source"], doc["category"], doc["title"], text, document_key=doc["file"])
+    upsert_document_hashes(conn, [(doc["file"], content_hash, len(stored))])
+    return removed, stored
+
+
+def upsert_document_hashes(conn, hashes, collection="registry"):
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """INSERT INTO rag_document_hashes (document_key, content_hash, chunk_count, collection)
+               VALUES %s
+               ON CONFLICT (document_key) DO UPDATE
+               SET content_hash = EXCLUDED.content_hash,
+                   chunk_count = EXCLUDED.chunk_count,
+                   collection = EXCLUDED.collection,
+                   updated_at = NOW()""",
+            [(key, content_hash, count, collection) for key, content_hash, count in hashes]
+        )
+
+
+def get_document_hashes(conn, collection="registry"):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT document_key, content_hash FROM rag_document_hashes WHERE collection = %s",
+            (collection,)
+        )
+        return dict(cur.fetchall())
+
+
+def remove_document(conn, document_key):
+    removed = delete_document_chunks(conn, document_key)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM rag_document_hashes WHERE document_key = %s", (document_key,))
+    return removed
+
+
+def _current_corpus_version(conn):
+    with conn.cursor() as cur:
+        cur.execute(CORPUS_VERSION_SQL)
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+
+def bump_corpus_version(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO rag_corpus_version (singleton, version, updated_at)
+            VALUES (TRUE, 1, NOW())
+            ON CONFLICT (singleton) DO UPDATE SET
+                version = rag_corpus_version.version + 1,
+                updated_at = EXCLUDED.updated_at
+            RETURNING version
+        """)
+        return cur.fetchone()[0]
+
+
+def _record_corpus_version(version):
+    global _corpus_version
+    # Only skip the reload if this process was already current; otherwise another process's
+    # change still has to be picked up.
+    if _corpus_version is not None and version == _corpus_version + 1:
+        _corpus_version = version
+
+
+def _check_corpus_version():
+    global _corpus_version, _corpus_checked_at
+    now = time.monotonic()
+    if _corpus_checked_at and now - _corpus_checked_at < RAG_VERSION_CHECK_SECONDS:
+        return
+
+    with _corpus_lock:
+        if _corpus_checked_at and now - _corpus_checked_at < RAG_VERSION_CHECK_SECONDS:
+            return
+        try:
+            with _get_connection() as conn:
+                version = _current_corpus_version(conn)
+                if _corpus_version is None:
+                    _corpus_version = version
+                elif version != _corpus_version:
+                    logger.info(f"RAG corpus changed (version {_corpus_version} -> {version}); reloading indexes")
+                    _reload_local_indexes(conn)
+        except Exception as e:
+            # Keep serving the indexes already loaded.
+            logger.warning(f"Failed to check RAG corpus version: {e}")
+        _corpus_checked_at = now
+
+
+def _reload_local_indexes(conn):
+    # Rebuilds what only this process holds. The process that changed the corpus has already
+    # embedded the new chunks and rewritten the shared vector store, which VectorStore.open picks up.
+    global _corpus_version, _vector_index, _vector_stale
+    _search_cache.clear()
+    # Read the version first so a change made during the rebuild triggers another one.
+    _corpus_version = _current_corpus_version(conn)
+    _get_index(conn, rebuild=True)
+    if RAG_BACKEND != "vector":
+        _vector_stale = True
+    elif not VECTOR_STORE_DIR and _vector_index is not None:
+        _vector_index = None
+
+
+def reload_indexes(conn=None):
+    with _get_connection(conn) as conn:
+        _reload_local_indexes(conn)
+        _refresh_vector_index(conn)
+
+
 def seed_rag_documents():
-    conn = _get_connection()
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM rag_documents")
-            count = cur.fetchone()[0]
-            if count > 0:
-                logger.info(f"RAG documents already seeded ({count} chunks). Skipping.")
-                return count
-
-        docs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "rag_documents")
-        total_chunks = 0
-
-        for doc in DOCUMENT_REGISTRY:
-            file_path = os.path.join(docs_dir, doc["file"])
-            if not os.path.exists(file_path):
-                logger.warning(f"RAG document not found: {file_path}")
-                continue
+        with _get_connection() as conn:
+            known = get_document_hashes(conn)
 
-            with open(file_path, "r") as f:
-                text = f.read()
+            docs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "rag_documents")
+            removed_count = 0
+            stored_count = 0
+            present = set()
 
-            chunks_stored = store_document(
-                source=doc["source"],
-                category=doc["category"],
-                title=doc["title"],
-                text=text,
-            )
-            total_chunks += chunks_stored
+            for doc in DOCUMENT_REGISTRY:
+                file_path = os.path.join(docs_dir, doc["file"])
+                if not os.path.exists(file_path):
+                    logger.warning(f"RAG document not found: {file_path}")
+                    continue
+
+                with open(file_path, "r") as f:
+                    text = f.read()
+                present.add(doc["file"])
 
-        logger.info(f"RAG seeding complete: {total_chunks} total chunks stored")
-        return total_chunks
+                content_hash = document_hash(doc, text)
+                if known.get(doc["file"]) == content_hash:
+                    continue
+
+                try:
+                    removed, stored = _sync_document(conn, doc, text, content_hash)
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Failed to store document '{doc['title']}': {e}")
+                    conn.rollback()
+                    continue
+                logger.info(f"Stored {len(stored)} chunks for '{doc['title']}' (replaced {len(removed)})")
+                removed_count += len(removed)
+                stored_count += len(stored)
+
+            for document_key in known.keys() - present:
+                try:
+                    removed = remove_document(conn, document_key)
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Failed to remove document '{document_key}': {e}")
+                    conn.rollback()
+                    continue
+                logger.info(f"Removed {len(removed)} chunks for '{document_key}'")
+                removed_count += len(removed)
+
+            if not removed_count and not stored_count:
+                logger.info("RAG documents up to date. Skipping.")
+                _check_corpus_version()
+                backfill_term_vectors(conn)
+                _get_index(conn)
+                _refresh_vector_index(conn, force=False)
+                return 0
+
+            bump_corpus_version(conn)
+            conn.commit()
+            # Removed chunks may have been canonical for near-duplicates elsewhere, so rebuild.
+            reload_indexes(conn)
+            logger.info(f"RAG seeding complete: {stored_count} chunks stored, {removed_count} removed")
+            return stored_count
 
     except Exception as e:
         logger.error(f"Failed to seed RAG documents: {e}")
         return 0
-    finally:
-        conn.close()
 
 
-def get_relevant_context(query_text, top_k=3, state_name=None, business_type=None):
-    results = search_similar(
+def retrieve_candidates(query_text, state_name=None, business_type=None, top_k=RAG_CANDIDATE_POOL, backend=None):
+    return search_similar(
         query_text,
         top_k=top_k,
         state_name=state_name,
-        business_type=business_type
+        business_type=business_type,
+        backend=backend
     )
 
+
+def rerank_candidates(candidates, categories=(), top_k=3):
+    from data.dedup import mmr_select
+
+    def boosted(r):
+        return r['similarity'] * (CATEGORY_RERANK_BOOST if r['category'] in categories else 1.0)
+
+    reranked = sorted(candidates, key=boosted, reverse=True)
+    return mmr_select(reranked, top_k, score=boosted)
+
+
+def format_context(results, query_text=None):
     if not results:
         return None
 
+    extract = None
+    if query_text:
+        from data.passages import PASSAGES_ENABLED, extract_passages
+        if PASSAGES_ENABLED:
+            extract = extract_passages
+
     min_score = 0.001
     sections = []
     for r in results:
         if r['similarity'] < min_score:
             continue
-        sections.append(f"[{r['title']}] ({r['source']} — {r['category']})\n{r['chunk_text']}")
+        label = r['title']
+        if r.get('heading_path'):
+            label += f" — {r['heading_path'].split(HEADING_SEPARATOR)[-1]}"
+        text = extract(r['chunk_text'], query_text) if extract else r['chunk_text']
+        sections.append(f"[{label}] ({r['source']} — {r['category']})\n{text}")
 
     if not sections:
         return None
 
     return "\n\n---\n\n".join(sections)
+
+
+def get_relevant_context(query_text, top_k=3, state_name=None, business_type=None, backend=None):
+    candidates = retrieve_candidates(
+        query_text,
+        state_name=state_name,
+        business_type=business_type,
+        top_k=max(top_k, RAG_CANDIDATE_POOL),
+        backend=backend
+    )
+    return format_context(rerank_candidates(candidates, top_k=top_k), query_text)
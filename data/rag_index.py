@@ -0,0 +1,116 @@
+import math
+import heapq
+import threading
+from collections import Counter
+
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class InvertedIndex:
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.doc_meta = {}
+        self.total_length = 0
+        self._idf = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    @property
+    def avg_doc_length(self):
+        if not self.doc_lengths:
+            return 0.0
+        return self.total_length / len(self.doc_lengths)
+
+    def add(self, doc_id, terms, meta=None, length=None):
+        term_counts = terms if isinstance(terms, dict) else Counter(terms)
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove(doc_id)
+
+            doc_length = length if length is not None else sum(term_counts.values())
+            for term, tf in term_counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_lengths[doc_id] = doc_length
+            self.doc_terms[doc_id] = tuple(term_counts)
+            self.doc_meta[doc_id] = meta or {}
+            self.total_length += doc_length
+            self._idf = {}
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove(doc_id)
+                self._idf = {}
+
+    def _remove(self, doc_id):
+        for term in self.doc_terms.pop(doc_id, ()):
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            plist.pop(doc_id, None)
+            if not plist:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.doc_meta.pop(doc_id, None)
+
+    def idf(self, term):
+        value = self._idf.get(term)
+        if value is None:
+            df = len(self.postings.get(term, ()))
+            n = len(self.doc_lengths)
+            value = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            self._idf[term] = value
+        return value
+
+    def term_counts(self, doc_id):
+        with self._lock:
+            return {term: self.postings[term][doc_id] for term in self.doc_terms.get(doc_id, ())}
+
+    def score(self, query_terms, doc_filter=None, idf=None, avgdl=None):
+        # idf/avgdl let a shard score against corpus-wide statistics instead of its own.
+        with self._lock:
+            if not self.doc_lengths:
+                return {}
+
+            k1 = self.k1
+            b = self.b
+            avgdl = avgdl or self.avg_doc_length or 1.0
+            doc_lengths = self.doc_lengths
+            doc_meta = self.doc_meta
+            rejected = set()
+            scores = {}
+
+            for term in set(query_terms):
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                term_idf = idf.get(term, 0.0) if idf is not None else self.idf(term)
+                for doc_id, tf in plist.items():
+                    if doc_id in rejected:
+                        continue
+                    if doc_filter is not None and doc_id not in scores and not doc_filter(doc_meta[doc_id]):
+                        rejected.add(doc_id)
+                        continue
+                    norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + term_idf * tf * (k1 + 1.0) / (tf + norm)
+
+            return scores
+
+    def search(self, query_terms, top_k=5, doc_filter=None, boost=None, idf=None, avgdl=None):
+        scores = self.score(query_terms, doc_filter=doc_filter, idf=idf, avgdl=avgdl)
+        if boost is not None:
+            for doc_id in scores:
+                scores[doc_id] *= boost(self.doc_meta[doc_id])
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,147 @@
+import os
+import heapq
+import math
+import itertools
+import zlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from data.rag_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# Every web worker process starts its own shard processes, so keep the default small.
+RAG_SHARDS = int(os.environ.get("RAG_SHARDS", "0")) or min(4, os.cpu_count() or 1)
+RAG_SHARD_BY = os.environ.get("RAG_SHARD_BY", "hash")
+
+_shard_index = None
+
+
+def _mp_context():
+    # Web workers are multithreaded, and forking them can copy a lock some other thread holds.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_shard(docs, k1, b):
+    global _shard_index
+    _shard_index = InvertedIndex(k1=k1, b=b)
+    for doc_id, terms, length, meta in docs:
+        _shard_index.add(doc_id, terms, meta, length=length)
+
+
+def _search_shard(query_terms, top_k, idf, avgdl, category, state_name, business_type, query_lower):
+    from data.rag import _matches_filters, _relevance_boost
+
+    def doc_filter(meta):
+        return _matches_filters(meta, category, state_name)
+
+    def boost(meta):
+        return _relevance_boost(meta, query_lower, business_type)
+
+    return _shard_index.search(
+        query_terms, top_k=top_k, doc_filter=doc_filter, boost=boost, idf=idf, avgdl=avgdl
+    )
+
+
+def shard_for(doc_id, meta, num_shards, shard_by=RAG_SHARD_BY):
+    if shard_by == "category":
+        key = meta.get('category') or ''
+    else:
+        key = str(doc_id)
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+
+class ShardedIndex:
+
+    def __init__(self, index, num_shards=RAG_SHARDS, shard_by=RAG_SHARD_BY):
+        self.num_shards = max(1, num_shards)
+        self.shard_by = shard_by
+        self.source = index
+        self.broken = False
+        self.k1 = index.k1
+        self.b = index.b
+
+        with index._lock:
+            shards = [[] for _ in range(self.num_shards)]
+            for doc_id, length in index.doc_lengths.items():
+                meta = index.doc_meta[doc_id]
+                shard = shard_for(doc_id, meta, self.num_shards, shard_by)
+                shards[shard].append((doc_id, index.term_counts(doc_id), length, meta))
+            self.doc_freq = {term: len(plist) for term, plist in index.postings.items()}
+            self.doc_count = len(index)
+            self.avgdl = index.avg_doc_length or 1.0
+
+        self.shard_categories = [{doc[3].get('category') for doc in shard} for shard in shards]
+        self.shard_sizes = [len(shard) for shard in shards]
+        # One single-process executor per shard keeps each shard resident in its own worker.
+        context = _mp_context()
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1, mp_context=context, initializer=_init_shard, initargs=(shard, self.k1, self.b)
+            )
+            for shard in shards
+        ]
+        logger.info(
+            f"Built sharded RAG index: {self.doc_count} chunks across {self.num_shards} shards "
+            f"(by {shard_by}, sizes {self.shard_sizes})"
+        )
+
+    def is_current(self, index):
+        # Chunks added to the live index by store_document reach the shards on the next reload,
+        # rather than restarting every shard process for each stored document.
+        return index is self.source and not self.broken
+
+    def idf(self, term):
+        df = self.doc_freq.get(term, 0)
+        return math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def search(self, query_terms, top_k=5, category=None, state_name=None, business_type=None, query_lower=""):
+        terms = [t for t in set(query_terms) if t in self.doc_freq]
+        if not terms:
+            return []
+        idf = {t: self.idf(t) for t in terms}
+
+        futures = []
+        for shard, executor in enumerate(self._executors):
+            if not self.shard_sizes[shard]:
+                continue
+            if category and self.shard_by == "category" and category not in self.shard_categories[shard]:
+                continue
+            futures.append(executor.submit(
+                _search_shard, terms, top_k, idf, self.avgdl,
+                category, state_name, business_type, query_lower
+            ))
+
+        # Each shard returns its own top-k in descending order; a heap merge yields the global top-k.
+        try:
+            per_shard = [future.result() for future in futures]
+        except Exception:
+            # A dead shard process leaves its executor unusable; rebuild the shards on the next search.
+            self.broken = True
+            raise
+        return list(itertools.islice(heapq.merge(*per_shard, key=lambda item: -item[1]), top_k))
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_sharded = None
+_sharded_lock = threading.Lock()
+
+
+def get_sharded_index(index):
+    global _sharded
+    if _sharded is not None and _sharded.is_current(index):
+        return _sharded
+
+    with _sharded_lock:
+        if _sharded is None or not _sharded.is_current(index):
+            previous = _sharded
+            _sharded = ShardedIndex(index)
+            if previous is not None:
+                previous.close()
+        return _sharded
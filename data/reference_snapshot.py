@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+from psycopg2.extras import RealDictCursor
+
+from data.db import connection
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_VERSION_CHECK_SECONDS = float(os.environ.get("REFERENCE_VERSION_CHECK_SECONDS", "300"))
+
+VERSION_SQL = "SELECT version FROM reference_data_version"
+
+
+def _first_by(rows, key):
+    index = {}
+    for row in rows:
+        index.setdefault(row[key], row)
+    return index
+
+
+def _group_by(rows, key):
+    index = {}
+    for row in rows:
+        index.setdefault(row[key], []).append(row)
+    return index
+
+
+class ReferenceSnapshot:
+
+    def __init__(self, version, profiles, regulations, extension, benchmarks, programs, commodities):
+        self.version = version
+        self.profiles = profiles
+        self.regulations = regulations
+        self.extension = extension
+        self.benchmarks = benchmarks
+        self.programs = programs
+        self.commodities = commodities
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, conn):
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(VERSION_SQL)
+            row = cur.fetchone()
+            version = row['version'] if row else None
+
+            def fetch(sql):
+                cur.execute(sql)
+                return [dict(r) for r in cur.fetchall()]
+
+            snapshot = cls(
+                version,
+                profiles=_first_by(fetch("SELECT * FROM state_ag_profiles"), 'state_name'),
+                regulations=_first_by(fetch("SELECT * FROM state_ag_regulations"), 'state_name'),
+                extension=_first_by(fetch("SELECT * FROM extension_services"), 'state_name'),
+                benchmarks=_first_by(fetch("SELECT * FROM business_type_benchmarks"), 'business_type'),
+                programs=_group_by(fetch(
+                    "SELECT * FROM state_financial_programs ORDER BY state_name, program_type, program_name"
+                ), 'state_name'),
+                commodities=_group_by(fetch(
+                    "SELECT * FROM state_commodities ORDER BY state_name, state_rank_national"
+                ), 'state_name'),
+            )
+        logger.info(
+            f"Loaded reference data snapshot (seed version {version}): "
+            f"{len(snapshot.profiles)} states, {len(snapshot.benchmarks)} business types"
+        )
+        return snapshot
+
+
+_snapshot = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def _current_version(conn):
+    with conn.cursor() as cur:
+        cur.execute(VERSION_SQL)
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def get_snapshot(reload=False):
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    if not reload and _checked_at and now - _checked_at < REFERENCE_VERSION_CHECK_SECONDS:
+        return _snapshot
+
+    with _snapshot_lock:
+        if not reload and _checked_at and now - _checked_at < REFERENCE_VERSION_CHECK_SECONDS:
+            return _snapshot
+        try:
+            with connection("reference") as conn:
+                if reload or _snapshot is None or _current_version(conn) != _snapshot.version:
+                    _snapshot = ReferenceSnapshot.load(conn)
+        except Exception as e:
+            # Serve the previous snapshot if there is one; callers fall back to live queries otherwise.
+            logger.warning(f"Failed to refresh reference data snapshot: {e}")
+        _checked_at = now
+        return _snapshot
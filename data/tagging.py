@@ -0,0 +1,102 @@
+import re
+import hashlib
+from collections import Counter
+
+TAG_MIN_MENTIONS = 2
+
+# Phrases that identify each business type offered in the onboarding form. Types
+# missing here fall back to the words of their own label. Single commodity words
+# ("milk", "grape", "vegetable") show up in general material and are left out.
+BUSINESS_TYPE_VOCABULARY = {
+    "Row Crop Farm": ["row crop", "grain farm", "cash grain", "corn-soybean rotation"],
+    "Livestock Operation": ["cow-calf", "feedlot", "beef cattle", "swine"],
+    "Mixed Farming": ["mixed farm", "diversified farm", "crop-livestock"],
+    "Dairy Operation": ["dairy", "milking", "lactation"],
+    "Specialty Crop / Horticulture": ["horticulture", "horticultural", "produce grower"],
+    "Vineyard / Winery": ["vineyard", "winery", "viticulture"],
+    "Orchard": ["orchard", "fruit tree", "tree nut"],
+    "Nursery / Greenhouse": ["plant nursery", "nursery stock", "greenhouse", "bedding plant", "floriculture"],
+    "Ag Equipment Dealer / Service": ["equipment dealer", "equipment service", "parts department"],
+    "Ag Input Supplier": ["input supplier", "agronomy retail", "fertilizer dealer", "seed dealer", "chemical dealer"],
+    "Grain Elevator / Storage": ["grain elevator", "elevator operator", "commercial grain storage"],
+    "Food Processing / Packing": ["food processing", "food processor", "packing shed", "packinghouse", "co-packer"],
+    "Ag Tech / Precision Ag": ["precision ag", "precision agriculture", "ag tech", "variable rate", "yield monitor"],
+    "Ag Finance / Lending": ["ag lender", "agricultural lender", "loan officer", "lending institution"],
+    "Ag Consulting": ["crop consultant", "crop advisor", "agronomic consulting"],
+    "Cooperative": ["agricultural cooperative", "farmer cooperative", "marketing cooperative"],
+}
+
+_GENERIC_WORDS = {"ag", "farm", "operation", "business", "other", "service", "and"}
+
+
+def _label_phrases(label):
+    phrases = []
+    for part in label.split("/"):
+        words = [w for w in re.findall(r"[a-z]+", part.lower()) if w not in _GENERIC_WORDS]
+        if words:
+            phrases.append(" ".join(words))
+    return phrases
+
+
+def _pattern(phrases):
+    alternatives = sorted({re.escape(p) for p in phrases}, key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(alternatives) + r")(?:e?s)?\b", re.IGNORECASE)
+
+
+class ChunkTagger:
+
+    def __init__(self, states, business_types, min_mentions=TAG_MIN_MENTIONS):
+        self.states = list(states)
+        self.business_types = list(business_types)
+        self.min_mentions = min_mentions
+        # Longest names first so "West Virginia" wins over "Virginia"; skip "Washington, D.C.".
+        self._state_re = re.compile(
+            r"\b(" + "|".join(re.escape(s) for s in sorted(self.states, key=len, reverse=True)) + r")\b"
+            r"(?!,?\s*D\.?\s?C\b)"
+        )
+        self._business_res = {}
+        for business_type in self.business_types:
+            phrases = BUSINESS_TYPE_VOCABULARY.get(business_type) or _label_phrases(business_type)
+            if phrases:
+                self._business_res[business_type] = _pattern(phrases)
+
+    @property
+    def signature(self):
+        payload = repr((self.states, self.business_types, self.min_mentions, sorted(
+            (k, v) for k, v in BUSINESS_TYPE_VOCABULARY.items() if k in self.business_types
+        )))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _dominant(self, counts):
+        # Only tag a chunk that is clearly about one value; a tag hides it from every other value.
+        if len(counts) != 1:
+            return None
+        value, mentions = counts.most_common(1)[0]
+        return value if mentions >= self.min_mentions else None
+
+    def tag_state(self, text):
+        return self._dominant(Counter(m.group(1) for m in self._state_re.finditer(text)))
+
+    def tag_business_type(self, text):
+        counts = Counter()
+        for business_type, pattern in self._business_res.items():
+            mentions = len(pattern.findall(text))
+            if mentions:
+                counts[business_type] = mentions
+        return self._dominant(counts)
+
+    def tag(self, text):
+        return self.tag_state(text), self.tag_business_type(text)
+
+
+_tagger = None
+
+
+def configure_tagger(states, business_types):
+    global _tagger
+    _tagger = ChunkTagger(states, business_types)
+    return _tagger
+
+
+def get_tagger():
+    return _tagger
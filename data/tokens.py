@@ -0,0 +1,11 @@
+import re
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    pieces = _TOKEN_RE.findall(text)
+    words = sum(1 for p in pieces if p[0].isalpha())
+    return int(words * 1.3 + (len(pieces) - words) + 0.5)
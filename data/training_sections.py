@@ -0,0 +1,56 @@
+import os
+import threading
+
+from data.chunking import chunk_markdown, HEADING_SEPARATOR
+from data.rag import _tokenize
+from data.rag_index import InvertedIndex
+
+TRAINING_SECTIONS_TOP_N = int(os.environ.get("TRAINING_SECTIONS_TOP_N", "6"))
+TRAINING_FULL_FILE = os.environ.get("TRAINING_FULL_FILE", "").lower() in ("1", "true", "yes")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class SectionIndex:
+
+    def __init__(self, text):
+        self.sections = []
+        self.index = InvertedIndex()
+        for position, chunk in enumerate(chunk_markdown(text)):
+            path = chunk["heading_path"].split(HEADING_SEPARATOR) if chunk["heading_path"] else []
+            # The first heading is the document title, repeated on every section.
+            heading = HEADING_SEPARATOR.join(path[1:]) or HEADING_SEPARATOR.join(path)
+            self.sections.append((heading, chunk["text"]))
+            self.index.add(position, _tokenize(f"{heading} {chunk['text']}"))
+
+    def __len__(self):
+        return len(self.sections)
+
+    def top_sections(self, query_text, top_n=TRAINING_SECTIONS_TOP_N):
+        ranked = self.index.search(_tokenize(query_text), top_k=top_n)
+        positions = [position for position, _ in ranked]
+        if not positions:
+            positions = list(range(min(top_n, len(self.sections))))
+        return sorted(positions)
+
+    def render(self, positions):
+        parts = []
+        for position in positions:
+            heading, text = self.sections[position]
+            parts.append(f"### {heading}\n{text}" if heading else text)
+        return "\n\n".join(parts)
+
+    def relevant_text(self, query_text, top_n=TRAINING_SECTIONS_TOP_N):
+        return self.render(self.top_sections(query_text, top_n))
+
+
+def index_training_text(key, text):
+    section_index = SectionIndex(text)
+    with _indexes_lock:
+        _indexes[key] = section_index
+    return section_index
+
+
+def get_section_index(key):
+    return _indexes.get(key)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+from data.embeddings import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_DTYPE = os.environ.get("RAG_VECTOR_DTYPE", "float16")
+MANIFEST_FILE = "manifest.json"
+STALE_GENERATION_SECONDS = 300
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class VectorStore:
+
+    def __init__(self, directory, dtype=VECTOR_STORE_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self._index = None
+        self._manifest = None
+        self._manifest_stat = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, ids, vectors, metas, model_id, dim):
+        os.makedirs(self.directory, exist_ok=True)
+        generation = f"{time.time_ns()}-{os.getpid()}"
+        files = {
+            "vectors": f"vectors-{generation}.npy",
+            "ids": f"ids-{generation}.npy",
+            "meta": f"meta-{generation}.json",
+        }
+
+        count = len(ids)
+        matrix = np.lib.format.open_memmap(
+            self._path(files["vectors"]), mode="w+", dtype=self.dtype, shape=(count, dim)
+        )
+        for i, vector in enumerate(vectors):
+            matrix[i] = vector
+        matrix.flush()
+        del matrix
+
+        np.save(self._path(files["ids"]), np.asarray(ids, dtype=np.int64))
+        with open(self._path(files["meta"]), "w") as f:
+            json.dump({
+                "categories": [m['category'] for m in metas],
+                "states": [m['state_relevance'] for m in metas],
+                "business_types": [m['business_type_relevance'] for m in metas],
+            }, f)
+        for name in files.values():
+            _fsync_file(self._path(name))
+
+        manifest = {
+            "generation": generation,
+            "model_id": model_id,
+            "dim": dim,
+            "dtype": self.dtype.name,
+            "count": count,
+            **files,
+        }
+        tmp_path = self._path(f".{MANIFEST_FILE}.{generation}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+        self._remove_stale_generations(generation)
+        logger.info(f"Wrote RAG vector store generation {generation}: {count} vectors ({self.dtype.name})")
+        return manifest
+
+    def _remove_stale_generations(self, current_generation):
+        cutoff = time.time() - STALE_GENERATION_SECONDS
+        for name in os.listdir(self.directory):
+            if current_generation in name or name == MANIFEST_FILE:
+                continue
+            if not name.startswith(("vectors-", "ids-", "meta-", f".{MANIFEST_FILE}.")):
+                continue
+            path = self._path(name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self, manifest):
+        matrix = np.load(self._path(manifest["vectors"]), mmap_mode="r")
+        ids = np.load(self._path(manifest["ids"]), mmap_mode="r")
+        with open(self._path(manifest["meta"])) as f:
+            meta = json.load(f)
+        return VectorIndex.from_arrays(
+            manifest["dim"], ids, matrix,
+            meta["categories"], meta["states"], meta["business_types"]
+        )
+
+    def open(self, model_id):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+
+        manifest_stat = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            if manifest_stat != self._manifest_stat:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                self._index = self._load(manifest)
+                self._manifest = manifest
+                self._manifest_stat = manifest_stat
+                logger.info(f"Opened RAG vector store generation {manifest['generation']} ({manifest['count']} vectors)")
+
+            if self._manifest["model_id"] != model_id:
+                return None
+            return self._index
@@ -2,105 +2,30 @@ import re
 import csv
 import io
 from datetime import datetime
+from contextvars import copy_context
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import Flask, render_template, request, jsonify, session
 import os
-import psycopg2
 import psycopg2.extras
 
 from data.financial_analysis import analyze_records
+from data.db import connection as db_connection, pool_metrics
+from data.query import request_memo
+from data.rag import search_cache_stats
+from data.tagging import configure_tagger
+from data.profile_options import US_STATES, BOARD_SUGGESTIONS
 
 from agents import (
     ADVISOR_CLASSES, BASE_ADVISORS, OPTIONAL_ADVISORS, ALL_ADVISORS,
     BASE_ADVISOR_IDS, OPTIONAL_ADVISOR_IDS, BoardChair
 )
+from agents.base import BoardContext, invalidate_system_prompts, prompt_cache_stats, prompt_usage_stats
+from data.context_bundles import context_bundle_stats
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
-US_STATES = [
-    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado",
-    "Connecticut", "Delaware", "Florida", "Georgia", "Hawaii", "Idaho",
-    "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky", "Louisiana",
-    "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota",
-    "Mississippi", "Missouri", "Montana", "Nebraska", "Nevada",
-    "New Hampshire", "New Jersey", "New Mexico", "New York",
-    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon",
-    "Pennsylvania", "Rhode Island", "South Carolina", "South Dakota",
-    "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington",
-    "West Virginia", "Wisconsin", "Wyoming"
-]
-
-BOARD_SUGGESTIONS = {
-    "Row Crop Farm": {
-        "recommended": ["agronomist", "commodity_risk"],
-        "tip": "Row crop operations benefit greatly from an Agronomist for crop planning and soil health, and a Commodity Risk Advisor to manage grain market exposure and hedge positions."
-    },
-    "Livestock Operation": {
-        "recommended": ["livestock", "commodity_risk"],
-        "tip": "Livestock operations should consider a Livestock & Animal Systems Advisor for herd management and animal health, and a Commodity Risk Advisor to manage feed cost volatility."
-    },
-    "Mixed Farming": {
-        "recommended": ["agronomist", "livestock", "commodity_risk"],
-        "tip": "Mixed operations juggle crops and livestock — an Agronomist, Livestock Advisor, and Commodity Risk Advisor together give you full coverage across your diversified operation."
-    },
-    "Dairy Operation": {
-        "recommended": ["livestock", "commodity_risk"],
-        "tip": "Dairy operations benefit from a Livestock & Animal Systems Advisor for herd health and production, plus a Commodity Risk Advisor to manage milk and feed price risk."
-    },
-    "Specialty Crop / Horticulture": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Specialty crop growers benefit from an Agronomist for crop-specific guidance and a Sustainability Advisor to explore certifications like organic or GAP that can boost margins."
-    },
-    "Vineyard / Winery": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Vineyards and wineries benefit from an Agronomist for viticulture expertise and a Sustainability Advisor for sustainable growing certifications that resonate with consumers."
-    },
-    "Orchard": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Orchard operations benefit from an Agronomist for tree crop management and a Sustainability Advisor to explore organic or conservation certifications."
-    },
-    "Nursery / Greenhouse": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Nursery and greenhouse operations benefit from an Agronomist for plant production expertise and a Sustainability Advisor for energy efficiency and environmental certifications."
-    },
-    "Ag Equipment Dealer / Service": {
-        "recommended": [],
-        "tip": "Equipment dealers may not need the production-focused optional advisors, but consider the Sustainability Advisor if you're selling precision ag or conservation equipment."
-    },
-    "Ag Input Supplier": {
-        "recommended": ["agronomist"],
-        "tip": "Input suppliers can benefit from an Agronomist to better understand the technical needs of your farming customers and provide informed product recommendations."
-    },
-    "Grain Elevator / Storage": {
-        "recommended": ["commodity_risk"],
-        "tip": "Grain elevators and storage operations deal directly with commodity markets — a Commodity Risk Advisor is highly recommended for basis management and hedging strategies."
-    },
-    "Food Processing / Packing": {
-        "recommended": ["sustainability"],
-        "tip": "Food processors benefit from a Sustainability Advisor for certifications, waste reduction, and meeting retailer sustainability requirements."
-    },
-    "Ag Tech / Precision Ag": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Ag tech companies benefit from an Agronomist to ground your solutions in production reality, and a Sustainability Advisor to align with growing ESG and carbon market opportunities."
-    },
-    "Ag Finance / Lending": {
-        "recommended": ["commodity_risk"],
-        "tip": "Ag lenders benefit from a Commodity Risk Advisor to better understand the commodity risk exposure of your borrowers."
-    },
-    "Ag Consulting": {
-        "recommended": ["agronomist", "sustainability"],
-        "tip": "Ag consultants benefit from an Agronomist and Sustainability Advisor to broaden the expertise you can offer your clients."
-    },
-    "Cooperative": {
-        "recommended": ["commodity_risk", "agronomist"],
-        "tip": "Cooperatives can benefit from a Commodity Risk Advisor for member grain marketing programs and an Agronomist to support member production advice."
-    },
-    "Other Ag Business": {
-        "recommended": [],
-        "tip": "Review the optional advisors and add any that align with your specific business needs. You can always change your board later."
-    }
-}
+configure_tagger(US_STATES, BOARD_SUGGESTIONS)
 
 conversation_histories = {}
 user_profiles = {}
@@ -176,10 +101,12 @@ def detect_specific_advisor(message, active_advisors):
     return None
 
 
-def get_advisor_response(advisor_id, message, session_id, user_profile):
+def get_advisor_response(advisor_id, message, session_id, user_profile, board_context=None):
     advisor_class = ADVISOR_CLASSES.get(advisor_id)
     if advisor_class:
-        return advisor_class.get_response(message, session_id, user_profile, conversation_histories)
+        return advisor_class.get_response(
+            message, session_id, user_profile, conversation_histories, board_context=board_context
+        )
     return {
         'advisor_id': advisor_id,
         'response': "Advisor not found.",
@@ -203,6 +130,7 @@ def save_profile():
     session_id = data.get('session_id', 'default')
 
     existing_profile = user_profiles.get(session_id, {})
+    invalidate_system_prompts(existing_profile)
 
     user_profiles[session_id] = {
         'business_name': data.get('business_name', ''),
@@ -245,6 +173,7 @@ def upload_records():
 
         if session_id not in user_profiles:
             user_profiles[session_id] = {}
+        invalidate_system_prompts(user_profiles[session_id])
 
         user_profiles[session_id]['business_data'] = {
             'summary': summary,
@@ -283,7 +212,8 @@ def chat():
         return jsonify({'error': 'No message provided'}), 400
 
     user_profile = user_profiles.get(session_id)
-    result = get_advisor_response(advisor_id, message, session_id, user_profile)
+    with request_memo():
+        result = get_advisor_response(advisor_id, message, session_id, user_profile)
 
     if 'Error' in result.get('response', ''):
         return jsonify({'error': result['response']}), 500
@@ -312,7 +242,8 @@ def chat_all():
     specific_advisor = detect_specific_advisor(message, active_advisors)
 
     if specific_advisor:
-        result = get_advisor_response(specific_advisor, message, session_id, user_profile)
+        with request_memo():
+            result = get_advisor_response(specific_advisor, message, session_id, user_profile)
         return jsonify({
             'mode': 'single',
             'responses': [result]
@@ -333,9 +264,15 @@ def chat_all():
 
     responses = []
     max_workers = max(1, len(selected_advisors))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    # Each worker runs in a copy of this context, so all of them share the request's query memo.
+    with request_memo(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Profile data and retrieved documents are the same for every advisor; build them once.
+        board_context = BoardContext.build(message, user_profile)
         futures = {
-            executor.submit(get_advisor_response, advisor_id, message, session_id, user_profile): advisor_id
+            executor.submit(
+                copy_context().run, get_advisor_response,
+                advisor_id, message, session_id, user_profile, board_context
+            ): advisor_id
             for advisor_id in selected_advisors.keys()
         }
 
@@ -397,6 +334,21 @@ def get_advisors():
     })
 
 
+@app.route('/api/metrics/db')
+def get_db_metrics():
+    return jsonify(pool_metrics())
+
+
+@app.route('/api/metrics/cache')
+def get_cache_metrics():
+    return jsonify({
+        'rag_search': search_cache_stats(),
+        'system_prompt': prompt_cache_stats(),
+        'context_bundles': context_bundle_stats(),
+        'prompt_usage': prompt_usage_stats(),
+    })
+
+
 @app.route('/api/suggestions/<business_type>')
 def get_suggestions(business_type):
     suggestion = BOARD_SUGGESTIONS.get(business_type, BOARD_SUGGESTIONS['Other Ag Business'])
@@ -404,7 +356,7 @@ def get_suggestions(business_type):
 
 
 def get_db_connection():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    return db_connection("app")
 
 
 def extract_action_items(text, advisor_source=None):
@@ -452,40 +404,39 @@ def create_plan():
         return jsonify({'error': 'No action items could be extracted or provided'}), 400
 
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO action_plans (session_id, title) VALUES (%s, %s) RETURNING id, created_at",
-                (session_id, title)
-            )
-            plan_row = cur.fetchone()
-            plan_id = plan_row[0]
-            plan_created_at = plan_row[1]
-
-            created_items = []
-            for item in items:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
                 cur.execute(
-                    """INSERT INTO action_items (plan_id, description, advisor_source, priority, due_date, notes)
-                       VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, created_at""",
-                    (plan_id, item.get('description', ''),
-                     item.get('advisor_source', advisor_source),
-                     item.get('priority', 'medium'),
-                     item.get('due_date', None),
-                     item.get('notes', None))
+                    "INSERT INTO action_plans (session_id, title) VALUES (%s, %s) RETURNING id, created_at",
+                    (session_id, title)
                 )
-                item_row = cur.fetchone()
-                created_items.append({
-                    'id': item_row[0],
-                    'description': item.get('description', ''),
-                    'advisor_source': item.get('advisor_source', advisor_source),
-                    'priority': item.get('priority', 'medium'),
-                    'status': 'pending',
-                    'due_date': item.get('due_date', None),
-                    'notes': item.get('notes', None),
-                    'created_at': item_row[1].isoformat()
-                })
-        conn.commit()
-        conn.close()
+                plan_row = cur.fetchone()
+                plan_id = plan_row[0]
+                plan_created_at = plan_row[1]
+
+                created_items = []
+                for item in items:
+                    cur.execute(
+                        """INSERT INTO action_items (plan_id, description, advisor_source, priority, due_date, notes)
+                           VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, created_at""",
+                        (plan_id, item.get('description', ''),
+                         item.get('advisor_source', advisor_source),
+                         item.get('priority', 'medium'),
+                         item.get('due_date', None),
+                         item.get('notes', None))
+                    )
+                    item_row = cur.fetchone()
+                    created_items.append({
+                        'id': item_row[0],
+                        'description': item.get('description', ''),
+                        'advisor_source': item.get('advisor_source', advisor_source),
+                        'priority': item.get('priority', 'medium'),
+                        'status': 'pending',
+                        'due_date': item.get('due_date', None),
+                        'notes': item.get('notes', None),
+                        'created_at': item_row[1].isoformat()
+                    })
+            conn.commit()
 
         return jsonify({
             'id': plan_id,
@@ -503,32 +454,31 @@ def create_plan():
 def get_plans():
     session_id = _get_session_id()
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(
-                "SELECT * FROM action_plans WHERE session_id = %s AND status != 'archived' ORDER BY created_at DESC",
-                (session_id,)
-            )
-            plans = cur.fetchall()
-
-            result = []
-            for plan in plans:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                 cur.execute(
-                    "SELECT * FROM action_items WHERE plan_id = %s ORDER BY created_at ASC",
-                    (plan['id'],)
+                    "SELECT * FROM action_plans WHERE session_id = %s AND status != 'archived' ORDER BY created_at DESC",
+                    (session_id,)
                 )
-                items = cur.fetchall()
-                plan_dict = dict(plan)
-                plan_dict['created_at'] = plan_dict['created_at'].isoformat()
-                plan_dict['items'] = []
-                for item in items:
-                    item_dict = dict(item)
-                    item_dict['created_at'] = item_dict['created_at'].isoformat()
-                    if item_dict.get('due_date'):
-                        item_dict['due_date'] = item_dict['due_date'].isoformat()
-                    plan_dict['items'].append(item_dict)
-                result.append(plan_dict)
-        conn.close()
+                plans = cur.fetchall()
+
+                result = []
+                for plan in plans:
+                    cur.execute(
+                        "SELECT * FROM action_items WHERE plan_id = %s ORDER BY created_at ASC",
+                        (plan['id'],)
+                    )
+                    items = cur.fetchall()
+                    plan_dict = dict(plan)
+                    plan_dict['created_at'] = plan_dict['created_at'].isoformat()
+                    plan_dict['items'] = []
+                    for item in items:
+                        item_dict = dict(item)
+                        item_dict['created_at'] = item_dict['created_at'].isoformat()
+                        if item_dict.get('due_date'):
+                            item_dict['due_date'] = item_dict['due_date'].isoformat()
+                        plan_dict['items'].append(item_dict)
+                    result.append(plan_dict)
         return jsonify(result)
     except Exception:
         return jsonify({'error': 'Failed to fetch plans'}), 500
@@ -539,35 +489,32 @@ def update_plan_item(plan_id, item_id):
     session_id = _get_session_id()
     data = request.json
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT ap.id FROM action_plans ap JOIN action_items ai ON ai.plan_id = ap.id WHERE ap.id = %s AND ai.id = %s AND ap.session_id = %s",
-                (plan_id, item_id, session_id)
-            )
-            if not cur.fetchone():
-                conn.close()
-                return jsonify({'error': 'Item not found'}), 404
-
-            updates = []
-            values = []
-            allowed_fields = ['status', 'priority', 'notes', 'due_date', 'description']
-            for field in allowed_fields:
-                if field in data:
-                    updates.append(f"{field} = %s")
-                    values.append(data[field])
-
-            if not updates:
-                conn.close()
-                return jsonify({'error': 'No fields to update'}), 400
-
-            values.extend([item_id, plan_id])
-            cur.execute(
-                f"UPDATE action_items SET {', '.join(updates)} WHERE id = %s AND plan_id = %s",
-                values
-            )
-        conn.commit()
-        conn.close()
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT ap.id FROM action_plans ap JOIN action_items ai ON ai.plan_id = ap.id WHERE ap.id = %s AND ai.id = %s AND ap.session_id = %s",
+                    (plan_id, item_id, session_id)
+                )
+                if not cur.fetchone():
+                    return jsonify({'error': 'Item not found'}), 404
+
+                updates = []
+                values = []
+                allowed_fields = ['status', 'priority', 'notes', 'due_date', 'description']
+                for field in allowed_fields:
+                    if field in data:
+                        updates.append(f"{field} = %s")
+                        values.append(data[field])
+
+                if not updates:
+                    return jsonify({'error': 'No fields to update'}), 400
+
+                values.extend([item_id, plan_id])
+                cur.execute(
+                    f"UPDATE action_items SET {', '.join(updates)} WHERE id = %s AND plan_id = %s",
+                    values
+                )
+            conn.commit()
         return jsonify({'status': 'updated'})
     except Exception:
         return jsonify({'error': 'Failed to update item'}), 500
@@ -577,15 +524,13 @@ def update_plan_item(plan_id, item_id):
 def delete_plan(plan_id):
     session_id = _get_session_id()
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM action_plans WHERE id = %s AND session_id = %s", (plan_id, session_id))
-            if not cur.fetchone():
-                conn.close()
-                return jsonify({'error': 'Plan not found'}), 404
-            cur.execute("UPDATE action_plans SET status = 'archived' WHERE id = %s", (plan_id,))
-        conn.commit()
-        conn.close()
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM action_plans WHERE id = %s AND session_id = %s", (plan_id, session_id))
+                if not cur.fetchone():
+                    return jsonify({'error': 'Plan not found'}), 404
+                cur.execute("UPDATE action_plans SET status = 'archived' WHERE id = %s", (plan_id,))
+            conn.commit()
         return jsonify({'status': 'archived'})
     except Exception:
         return jsonify({'error': 'Failed to delete plan'}), 500
@@ -597,9 +542,25 @@ if __name__ == '__main__':
         seed_all()
     except Exception as e:
         print(f"Note: Could not initialize state data: {e}")
+    try:
+        from data.reference_snapshot import get_snapshot
+        get_snapshot(reload=True)
+    except Exception as e:
+        print(f"Note: Could not load reference data snapshot: {e}")
+    try:
+        from data.context_bundles import CONTEXT_WARMUP, warm_context_bundles
+        if CONTEXT_WARMUP:
+            warm_context_bundles(US_STATES, BOARD_SUGGESTIONS)
+    except Exception as e:
+        print(f"Note: Could not warm context bundles: {e}")
     try:
         from data.rag import seed_rag_documents
         seed_rag_documents()
     except Exception as e:
         print(f"Note: Could not seed RAG documents: {e}")
+    try:
+        from agents.base import index_training_data
+        index_training_data(ADVISOR_CLASSES.values())
+    except Exception as e:
+        print(f"Note: Could not index training data: {e}")
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,7 +1,15 @@
 import os
+import hashlib
 import psycopg2
 from psycopg2.extras import execute_values
 
+from data.rag import create_rag_documents_table
+
+
+# The seed data lives in this file, so its hash identifies the reference data it produces.
+with open(__file__, "rb") as _seed_file:
+    SEED_VERSION = hashlib.sha256(_seed_file.read()).hexdigest()[:16]
+
 
 def get_connection():
     return psycopg2.connect(os.environ["DATABASE_URL"])
@@ -1232,22 +1240,34 @@ def create_action_plans(conn):
 
 
 def create_rag_documents(conn):
+    create_rag_documents_table(conn)
+
+
+def create_reference_data_version(conn):
     with conn.cursor() as cur:
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS rag_documents (
-                id SERIAL PRIMARY KEY,
-                source VARCHAR NOT NULL,
-                category VARCHAR NOT NULL,
-                title VARCHAR NOT NULL,
-                chunk_text TEXT NOT NULL,
-                embedding TEXT,
-                state_relevance VARCHAR,
-                business_type_relevance VARCHAR
+            CREATE TABLE IF NOT EXISTS reference_data_version (
+                singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+                version TEXT NOT NULL,
+                seeded_at TIMESTAMP NOT NULL DEFAULT NOW()
             );
         """)
     conn.commit()
 
 
+def record_seed_version(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO reference_data_version (singleton, version, seeded_at)
+            VALUES (TRUE, %s, NOW())
+            ON CONFLICT (singleton) DO UPDATE SET
+                version = EXCLUDED.version,
+                seeded_at = EXCLUDED.seeded_at
+            WHERE reference_data_version.version <> EXCLUDED.version
+        """, (SEED_VERSION,))
+    conn.commit()
+
+
 def seed_all():
     conn = get_connection()
     try:
@@ -1273,6 +1293,9 @@ def seed_all():
         print("Action plans tables created successfully.")
         create_rag_documents(conn)
         print("RAG documents table created successfully.")
+        create_reference_data_version(conn)
+        record_seed_version(conn)
+        print(f"Reference data version {SEED_VERSION} recorded.")
     finally:
         conn.close()
 